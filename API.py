@@ -1,169 +1,879 @@
 # Importation des bibliothèques
-from fastapi import FastAPI, Path
+import asyncio
+import hmac
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Literal, Optional
+from fastapi import Depends, FastAPI, Header, Path, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 import joblib
+import numpy as np
 import pandas as pd
 import shap
-from sklearn.neighbors import NearestNeighbors
-from sklearn.impute import SimpleImputer
 
+from artifacts import artifact_lock, file_hash
+from batching import MicroBatcher
+from distributions import FeatureDistributions
+from drift_monitor import DriftMonitor
+from formats import MEDIA_TYPES_BY_FORMAT, frame_records, negotiate_format, object_response, tabular_response
+from hot_reload import HotReloader, VersionHeaderMiddleware
+from inference import NativeBoosterEngine
+from http_cache import CachedBody, cached_response, weak_etag
+from knn_index import ApproxKnnIndex, KnnIndex
+from metrics import MetricsRegistry, TimingMiddleware, span
+from preprocessing import PreprocessedData
+from profiler import SamplingProfiler
+from route_limits import RouteLimiter
+from score_table import ScoreTable
+from shap_cache import ShapCache
+
+# Chemins des artefacts servis par l'API
+MODEL_PATH = os.environ.get("MODEL_PATH", "LGBMClassifier.pkl")
+DATA_PATH = os.environ.get("DATA_PATH", "test_df.parquet")
+
+# Rechargement à chaud : intervalle de surveillance des fichiers en secondes (0 = désactivée)
+# et jeton de la route d'administration (route désactivée s'il est vide)
+RELOAD_WATCH_INTERVAL = float(os.environ.get("RELOAD_WATCH_INTERVAL", 0))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Durée (s) pendant laquelle les clients HTTP réutilisent sans revalidation les réponses peu changeantes
+CACHE_MAX_AGE = int(os.environ.get("CACHE_MAX_AGE", 300))
+
+# Nombre maximal d'identifiants clients renvoyés par page ou par recherche
+CLIENT_IDS_MAX_LIMIT = 1000
+
+# Suivi de la dérive : fenêtres glissantes (nom:secondes), classes des histogrammes par feature
+# et seuil du PSI au-delà duquel une feature est considérée en dérive
+DRIFT_WINDOWS = {name: int(seconds) for name, seconds in
+                 (window.split(":") for window in os.environ.get("DRIFT_WINDOWS", "5m:300,1h:3600,24h:86400").split(","))}
+DRIFT_BINS = int(os.environ.get("DRIFT_BINS", 20))
+DRIFT_PSI_THRESHOLD = float(os.environ.get("DRIFT_PSI_THRESHOLD", 0.2))
+
+# Profilage par échantillonnage via /admin/profile ("1" pour l'autoriser) et durée maximale d'un profilage (s)
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+PROFILER_MAX_SECONDS = float(os.environ.get("PROFILER_MAX_SECONDS", 60))
+
+# Standardisation des features avant le calcul des plus proches voisins ("standard" ou "none")
+KNN_SCALING = os.environ.get("KNN_SCALING", "none") == "standard"
+
+# Paramètres du mode approximatif : dimension de l'ACP et partitions parcourues par requête
+KNN_APPROX_COMPONENTS = int(os.environ.get("KNN_APPROX_COMPONENTS", 32))
+KNN_APPROX_PROBES = int(os.environ.get("KNN_APPROX_PROBES", 8))
+
+# Nombre maximal de plus proches voisins par requête (paramètre n_neighbors)
+KNN_MAX_NEIGHBORS = int(os.environ.get("KNN_MAX_NEIGHBORS", 100))
+
+# Seuil sur la probabilité de défaut (classe 1) au-delà duquel le crédit est refusé
+CREDIT_THRESHOLD = float(os.environ.get("CREDIT_THRESHOLD", 0.5))
+
+# Cœurs disponibles par worker : les cœurs de la machine partagés entre les WEB_CONCURRENCY workers
+# (fixé par gunicorn_api_conf.py), pour ne pas lancer workers x cœurs threads OpenMP
+WORKER_CPUS = max(1, (os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", 1)))
+
+# Moteur de scoring : "native" (API C du booster LightGBM, sans l'interface scikit-learn) ou "sklearn",
+# et nombre de threads du scoring d'un bloc de lignes
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "native")
+MODEL_THREADS = int(os.environ.get("MODEL_THREADS", WORKER_CPUS))
+
+# Nombre de clients scorés par appel au modèle dans la route de scoring par lot
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", 10000))
+
+# Regroupement des requêtes /credit concurrentes : taille maximale du lot et fenêtre d'attente
+MICROBATCH_MAX_SIZE = int(os.environ.get("MICROBATCH_MAX_SIZE", 64))
+MICROBATCH_WINDOW_MS = float(os.environ.get("MICROBATCH_WINDOW_MS", 2))
+
+# Cache SHAP : nombre de clients gardés en mémoire et remplissage du disque en tâche de fond
+SHAP_CACHE_SIZE = int(os.environ.get("SHAP_CACHE_SIZE", 1024))
+SHAP_CACHE_BACKGROUND_FILL = os.environ.get("SHAP_CACHE_BACKGROUND_FILL", "1") == "1"
+
+# Nombre de threads des calculs SHAP massifs (contributions natives de LightGBM)
+SHAP_THREADS = int(os.environ.get("SHAP_THREADS", WORKER_CPUS))
+
+# Taille minimale de l'échantillon de l'importance globale tant que le cache SHAP n'est pas rempli
+GLOBAL_IMPORTANCE_MIN_SAMPLE = int(os.environ.get("GLOBAL_IMPORTANCE_MIN_SAMPLE", 500))
+
+
+# Journal de l'API (même sortie que les messages du serveur uvicorn)
+logger = logging.getLogger("uvicorn.error")
+
+
+# Pool borné par famille de routes coûteuses : calculs en parallèle (<NOM>_MAX_CONCURRENCY) et
+# requêtes en attente (<NOM>_MAX_QUEUE) avant de répondre 503
+def route_limiter(name, max_concurrency, max_queue):
+    return RouteLimiter(name, int(os.environ.get(f"{name.upper()}_MAX_CONCURRENCY", max_concurrency)),
+                        int(os.environ.get(f"{name.upper()}_MAX_QUEUE", max_queue)))
+
+model_limiter = route_limiter("model", 1, 32)
+shap_limiter = route_limiter("shap", 2, 16)
+knn_limiter = route_limiter("knn", 2, 16)
+data_limiter = route_limiter("data", 4, 32)
+
+
+# Mémoire résidente du processus (octets), lue dans /proc si disponible
+def process_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Valeurs SHAP de la classe 0 (solvabilité) : selon la version de shap, la sortie est une liste
+# [classe 0, classe 1] ou directement la contribution à la classe 1 (opposée pour un modèle binaire)
+def class0_shap_values(explainer, X):
+    shap_values = explainer.shap_values(X)
+    if isinstance(shap_values, list):
+        return np.asarray(shap_values[0])
+    return -np.asarray(shap_values)
+
+# Valeur de base (espérance) de la classe 0, même convention que class0_shap_values
+def class0_expected_value(explainer):
+    expected_value = np.atleast_1d(explainer.expected_value)
+    return float(expected_value[0]) if len(expected_value) > 1 else -float(expected_value[0])
+
+# Sélection des top_k contributions SHAP les plus fortes en valeur absolue (sélection partielle),
+# éventuellement restreinte aux contributions positives ou négatives ; triées par |valeur| décroissante
+def select_top_shap(values, top_k=None, sign="all"):
+    if sign == "positive":
+        candidates = np.flatnonzero(values > 0)
+    elif sign == "negative":
+        candidates = np.flatnonzero(values < 0)
+    else:
+        candidates = np.arange(len(values))
+    magnitudes = np.abs(values[candidates])
+    if top_k is not None and top_k < len(candidates):
+        selected = np.argpartition(-magnitudes, top_k - 1)[:top_k]
+        candidates, magnitudes = candidates[selected], magnitudes[selected]
+    return candidates[np.argsort(-magnitudes, kind="stable")]
 
-# Initialisation d'une instance de l'API
-app = FastAPI()
-
-# Chargement du modèle de prédiction de crédit
-load_clf = joblib.load("LGBMClassifier.pkl")
-
-# Chargement du dataframe de données
-df = pd.read_parquet("test_df.parquet")
-
-# Identification des colonnes avec des valeurs manquantes
-columns_with_nan = df.columns[df.isna().any()].tolist()
+# Classe prédite à partir de la probabilité de défaut, sans second passage dans le modèle
+def predict_classes(proba):
+    return (proba[:, 1] > CREDIT_THRESHOLD).astype(int)
 
-# Création de l'instance SimpleImputer avec la stratégie de la médiane
-imputer = SimpleImputer(strategy='median')
+# Ligne NDJSON du résultat de scoring d'un client
+def ndjson_line(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
 
-# Remplacement des valeurs manquantes par la médiane de chaque colonne
-df[columns_with_nan] = imputer.fit_transform(df[columns_with_nan])
+# Champs du profil client affiché par le dashboard (jeu nommé "profile" du paramètre fields=)
+PROFILE_FIELDS = ['CODE_GENDER', 'DAYS_BIRTH', 'NAME_FAMILY_STATUS_MARRIED', 'CNT_CHILDREN',
+                  'FLAG_OWN_CAR', 'FLAG_OWN_REALTY', 'DAYS_EMPLOYED']
 
-# Définition des caractéristiques pertinentes (isolement des features non utilisées)
-ignore_features = ['Unnamed: 0', 'SK_ID_CURR', 'INDEX', 'TARGET']
-relevant_features = [col for col in df.columns if col not in ignore_features]
 
-# Création de l'explainer shap
-explainer = shap.TreeExplainer(load_clf)
+class ServingState:
+    """Modèle, données et tout l'état qui en dérive (médianes, index des identifiants, index kNN,
+    explainer SHAP, caches, table des scores) pour une version des fichiers MODEL_PATH et DATA_PATH.
+
+    Un état n'est jamais modifié après sa construction : un rechargement en construit un nouveau,
+    substitué d'un bloc à l'état servi (voir HotReloader).
+    """
+
+    def __init__(self, model_path, data_path):
+        # Chargement du modèle de prédiction de crédit
+        self.load_clf = joblib.load(model_path)
+
+        # Prédiction des probabilités : moteur natif sur le booster du modèle, ou interface scikit-learn
+        self.predictor = (NativeBoosterEngine(self.load_clf.booster_, num_threads=MODEL_THREADS)
+                          if INFERENCE_ENGINE == "native" else self.load_clf)
+
+        # Chargement des données pré-traitées (features imputées, médianes, index des identifiants),
+        # mappées en mémoire ; construites au premier démarrage si `python preprocessing.py` n'a pas été lancé
+        self.dataset = PreprocessedData.load_or_build(data_path)
+
+        # Empreintes des fichiers du modèle et des données, qui versionnent les artefacts pré-calculés
+        self.model_hash = file_hash(model_path)
+        self.data_hash = self.dataset.source
+
+        # Version du modèle servi, reportée dans les réponses
+        self.model_version = self.model_hash[:12]
+
+        # Date de la dernière modification des fichiers servis (en-tête Last-Modified)
+        self.last_modified = max(os.path.getmtime(model_path), os.path.getmtime(data_path))
+
+        # Corps des réponses peu changeantes, figés pour cette version (voir cached_body)
+        self._http_bodies = {}
+
+        # Caractéristiques pertinentes (features du modèle, dans l'ordre des colonnes)
+        self.relevant_features = self.dataset.feature_names
+
+        # Médiane de chaque feature, utilisée pour compléter les lignes brutes envoyées à l'API
+        self.feature_medians = self.dataset.medians
+
+        # Matrice des features (valeurs manquantes remplacées par la médiane), une ligne par client
+        self.features_matrix = self.dataset.features
+
+        # Index nom de feature -> colonne de features_matrix
+        self.feature_columns = self.dataset.feature_columns
+
+        # Rapport mémoire des données servies (stockage compact comparé à un dataframe float64)
+        self.memory_report = self.dataset.memory_report()
+        logger.info("Données servies : %d clients, %.1f Mo en mémoire (%.1f Mo en float64, réduction x%.1f)",
+                    self.memory_report["rows"], self.memory_report["compact_bytes"] / 1e6,
+                    self.memory_report["float64_bytes"] / 1e6, self.memory_report["reduction"])
+
+        # Index des plus proches voisins : rechargé depuis le disque s'il correspond aux données,
+        # reconstruit (puis sauvegardé à côté du parquet) sinon
+        self.knn_index = KnnIndex.load_or_build(data_path, self.features_matrix, source=self.data_hash,
+                                                scaling=KNN_SCALING)
+
+        # Index approximatif (ACP + partitions k-means) construit au-dessus de l'index exact
+        self.approx_knn_index = ApproxKnnIndex.load_or_build(data_path, self.knn_index,
+                                                             n_components=KNN_APPROX_COMPONENTS,
+                                                             n_probes=KNN_APPROX_PROBES)
+
+        # Résumés de distribution par feature sur toute la population, calculés une fois par version des données
+        self.feature_distributions = FeatureDistributions(self.features_matrix, self.relevant_features,
+                                                          version=self.data_hash[:12])
+
+        # Suivi de la dérive des clients scorés par rapport à la population servie (référence)
+        self.drift_monitor = DriftMonitor(self.features_matrix, self.relevant_features, DRIFT_WINDOWS,
+                                          n_bins=DRIFT_BINS, psi_threshold=DRIFT_PSI_THRESHOLD,
+                                          version=self.data_hash[:12])
+
+        # Jeux de champs nommés utilisables dans le paramètre fields= des routes de données clients
+        self.field_sets = {"profile": PROFILE_FIELDS, "features": self.relevant_features}
+
+        # Colonnes servies par les routes de données clients
+        self.data_columns = set(self.dataset.columns)
+
+        # Création de l'explainer shap
+        self.explainer = shap.TreeExplainer(self.load_clf)
+        self.expected_value = class0_expected_value(self.explainer)
+
+        # Cache des valeurs SHAP par client (LRU en mémoire + matrice mappée sur disque)
+        self.shap_cache = ShapCache(data_path, self.features_matrix,
+                                    lambda X: class0_shap_values(self.explainer, X),
+                                    source=f"{self.model_hash}:{self.data_hash}", lru_size=SHAP_CACHE_SIZE)
+
+        # Importance globale des features (moyenne des |SHAP| sur la population), mise en cache
+        self.global_importance = {}
+        self._global_importance_lock = threading.Lock()
+
+        # Table des scores de toute la population, recalculée si le modèle ou les données changent
+        self.score_table = ScoreTable.load_or_build(data_path, self.features_matrix, self.score_matrix,
+                                                    self.model_hash, self.data_hash, CREDIT_THRESHOLD)
+
+        # Regroupement des demandeurs /score concurrents en un seul appel au modèle (la table des scores
+        # ne couvre que la population servie) ; chaque demandeur tient une place de model_limiter
+        self.score_batcher = MicroBatcher(lambda X: list(zip(*self.score_matrix(X))),
+                                           max_batch_size=MICROBATCH_MAX_SIZE,
+                                           max_wait=MICROBATCH_WINDOW_MS / 1000, executor=model_limiter.executor)
+
+    # Corps de réponse en cache pour cette version, construit par build_fn() à la première demande ;
+    # reconstruit si les paramètres de version supplémentaires (extra) ont changé. Un tel corps change
+    # sans que les fichiers servis changent : il n'a pas de Last-Modified et se revalide par l'ETag
+    def cached_body(self, name, build_fn, media_type="application/json", extra=()):
+        etag = weak_etag(self.model_version, self.data_hash[:12], name, *extra)
+        cached = self._http_bodies.get(name)
+        if cached is None or cached.etag != etag:
+            cached = CachedBody(build_fn(), media_type, etag, None if extra else self.last_modified)
+            self._http_bodies[name] = cached
+        return cached
+
+    # Remplissage du cache SHAP puis calcul de l'importance globale sur toute la population
+    def start_background_tasks(self):
+        if SHAP_CACHE_BACKGROUND_FILL:
+            self.shap_cache.start_background_fill(self.parallel_shap_values,
+                                                  on_complete=self.compute_global_importance,
+                                                  chunk_size=1024, pause=0.01)
+
+    def stop_background_tasks(self):
+        self.shap_cache.stop_background_fill()
+
+    # Valeurs SHAP de la classe 0 pour de nombreuses lignes : contributions natives de LightGBM
+    # (identiques à celles de TreeExplainer), calculées en parallèle sur SHAP_THREADS cœurs ;
+    # la dernière colonne (valeur de base) est écartée
+    def parallel_shap_values(self, X):
+        contributions = self.load_clf.booster_.predict(X, pred_contrib=True, num_threads=SHAP_THREADS)
+        return -contributions[:, :-1]
+
+    def compute_global_importance(self):
+        shap_cache, global_importance = self.shap_cache, self.global_importance
+        with self._global_importance_lock:
+            n_filled = int(np.count_nonzero(shap_cache.filled))
+            n_total = len(shap_cache.filled)
+            sample_size = global_importance.get("sample_size", 0)
+            # Recalcul seulement lorsque l'échantillon couvert a nettement grossi
+            if global_importance and (n_filled == sample_size or (n_filled < n_total and n_filled < 1.1 * sample_size)):
+                return global_importance
+
+            # Tant que le cache est peu rempli, calcul d'un échantillon aléatoire (conservé dans le cache)
+            if n_filled < min(GLOBAL_IMPORTANCE_MIN_SAMPLE, n_total):
+                sample = np.random.default_rng(42).choice(n_total, size=min(GLOBAL_IMPORTANCE_MIN_SAMPLE, n_total),
+                                                           replace=False)
+                shap_cache.fill_positions(np.sort(sample[shap_cache.filled[sample] == 0]),
+                                          compute_fn=self.parallel_shap_values, chunk_size=1024)
+
+            means, sample_size = shap_cache.mean_abs_values()
+            order = np.argsort(means)[::-1]
+            global_importance.update({
+                "features": self.relevant_features,
+                "values": [means.tolist()],
+                "ranking": [{"feature": self.relevant_features[i], "mean_abs_shap": float(means[i])} for i in order],
+                "sample_size": sample_size,
+                "population_size": n_total,
+                "model_version": self.model_version,
+            })
+            return global_importance
+
+    # Récupération de la position d'un client, 404 si l'identifiant est inconnu
+    def get_client_position(self, id_client: int) -> int:
+        position = self.dataset.position(id_client)
+        if position is None:
+            raise HTTPException(status_code=404, detail=f"Client {id_client} introuvable")
+        return position
+
+    # Résolution du paramètre fields= (colonnes et/ou jeux nommés séparés par des virgules) en liste
+    # de colonnes ; SK_ID_CURR est toujours renvoyé, 422 pour un champ inconnu, None pour tout
+    def resolve_fields(self, fields: Optional[str]):
+        if not fields:
+            return None
+        names = ['SK_ID_CURR']
+        for field in (field.strip() for field in fields.split(",")):
+            names.extend(self.field_sets.get(field, [field]))
+        unknown = sorted({name for name in names if name not in self.data_columns})
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Champs inconnus : {unknown}")
+        return list(dict.fromkeys(names))
+
+    # Sélection des lignes (et éventuellement des colonnes) des données avant la sérialisation
+    def select_rows(self, positions, columns=None):
+        return self.dataset.frame(positions, columns)
+
+    # Scoring d'un bloc de lignes en un seul appel au modèle : (probabilités classe 0, classes)
+    def score_matrix(self, X):
+        proba = self.predictor.predict_proba(X)
+        return proba[:, 0], predict_classes(proba)
+
+    # Vérification que les noms de features reçus sont connus du modèle, 422 sinon
+    def check_feature_names(self, names):
+        unknown = set(names) - self.feature_columns.keys()
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Features inconnues : {sorted(unknown)}")
+
+    # Conversion de lignes de features brutes en matrice contiguë, complétée par les médianes stockées
+    def rows_to_matrix(self, rows):
+        return self.dataset.transform.transform(rows)
+
+    # Génération du flux de résultats par blocs pour borner la mémoire, dans l'ordre de la requête (un
+    # texte NDJSON par bloc) ; les scores sont lus dans la table, sans repasser par le modèle
+    def stream_batch_ids(self, ids):
+        for start in range(0, len(ids), BATCH_CHUNK_SIZE):
+            chunk = ids[start:start + BATCH_CHUNK_SIZE]
+            positions = self.dataset.positions(chunk)
+            self.drift_monitor.observe(self.features_matrix[positions[positions >= 0]])
+            yield "".join(ndjson_line({'SK_ID_CURR': id_client, 'Erreur': "Client introuvable"}) if position < 0
+                          else ndjson_line({'SK_ID_CURR': id_client, 'Prédiction': int(self.score_table.predictions[position]),
+                                            'Probabilité': float(self.score_table.probas[position])})
+                          for id_client, position in zip(chunk, positions.tolist()))
+
+    def stream_batch_rows(self, rows):
+        for start in range(0, len(rows), BATCH_CHUNK_SIZE):
+            chunk = rows[start:start + BATCH_CHUNK_SIZE]
+            X = self.rows_to_matrix(chunk)
+            self.drift_monitor.observe(X)
+            probas, predictions = self.score_matrix(X)
+            yield "".join(ndjson_line({'index': start + i, 'Prédiction': int(prediction), 'Probabilité': float(proba_0)})
+                          for i, (proba_0, prediction) in enumerate(zip(probas, predictions)))
+
+
+# Tâches de fond de l'état servi, lancées au démarrage de chaque worker (après le fork éventuel du serveur)
+background_tasks_started = threading.Event()
+
+# Substitution de l'état servi après un rechargement : les tâches de fond passent au nouvel état
+def swap_state(old, new):
+    logger.info("Version servie : modèle %s, données %s (précédente : modèle %s, données %s)",
+                new.model_version, new.data_hash[:12], old.model_version, old.data_hash[:12])
+    if background_tasks_started.is_set():
+        old.stop_background_tasks()
+        new.start_background_tasks()
+
+# Construction d'un état servi sous le verrou des artefacts : un seul worker (re)construit les données
+# pré-traitées, les index, la table des scores et le stockage SHAP, les autres chargent son résultat
+def build_serving_state():
+    with artifact_lock(DATA_PATH):
+        return ServingState(MODEL_PATH, DATA_PATH)
+
+# État servi, rechargé à chaud depuis MODEL_PATH et DATA_PATH (route /admin/reload ou surveillance des fichiers)
+reloader = HotReloader([MODEL_PATH, DATA_PATH], build_serving_state, build_serving_state(), on_swap=swap_state)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    background_tasks_started.set()
+    reloader.current.start_background_tasks()
+    if RELOAD_WATCH_INTERVAL > 0:
+        reloader.start_watch(RELOAD_WATCH_INTERVAL)
+    yield
+    reloader.stop()
+
+
+# Mesures du worker exposées sur /metrics : requêtes et étapes des routes (TimingMiddleware), et
+# valeurs lues à chaque collecte (caches de l'état servi, pools de calcul, mémoire du processus)
+metrics = MetricsRegistry()
+metrics.describe("api_cache_requests_total", "counter", "Lectures des caches par résultat")
+metrics.describe("api_cache_hit_ratio", "gauge", "Part des lectures servies par le cache")
+metrics.describe("api_pool_pending", "gauge", "Calculs en cours ou en attente par pool")
+metrics.describe("api_pool_rejected_total", "counter", "Requêtes refusées (503) par pool")
+metrics.describe("api_microbatch_batches_total", "counter", "Lots de scoring /score")
+metrics.describe("api_microbatch_requests_total", "counter", "Demandeurs /score regroupés")
+metrics.describe("api_model_info", "gauge", "Versions servies du modèle et des données")
+metrics.describe("process_resident_memory_bytes", "gauge", "Mémoire résidente du processus")
+
+def collect_serving_metrics():
+    current = reloader.current
+    shap_stats = current.shap_cache.stats()
+    caches = {"shap": {"memory_hit": shap_stats["hits"], "disk_hit": shap_stats["disk_hits"],
+                       "miss": shap_stats["misses"]}}
+    for cache, results in caches.items():
+        for result, count in results.items():
+            yield "api_cache_requests_total", (("cache", cache), ("result", result)), count
+        total = sum(results.values())
+        hits = total - results["miss"]
+        yield "api_cache_hit_ratio", (("cache", cache),), hits / total if total else 0.0
+    for limiter in [model_limiter, shap_limiter, knn_limiter, data_limiter]:
+        limiter_stats = limiter.stats()
+        yield "api_pool_pending", (("pool", limiter.name),), limiter_stats["pending"]
+        yield "api_pool_rejected_total", (("pool", limiter.name),), limiter_stats["rejected"]
+    batching = current.score_batcher.stats.as_dict()
+    yield "api_microbatch_batches_total", (), batching["batches"]
+    yield "api_microbatch_requests_total", (), batching["requests"]
+    yield "api_model_info", (("model_version", current.model_version), ("data_version", current.data_hash[:12])), 1
+    yield "process_resident_memory_bytes", (), process_rss()
+
+metrics.add_collector(collect_serving_metrics)
+
+# Profilage à la demande (/admin/profile)
+profiler = SamplingProfiler()
+
+# Initialisation d'une instance de l'API ; chaque réponse porte la version du modèle qui l'a produite
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(VersionHeaderMiddleware, reloader=reloader, version_fn=lambda state: state.model_version)
+app.add_middleware(TimingMiddleware, registry=metrics)
+
+# État servi pour la requête en cours, lu une seule fois à son arrivée : une requête commencée
+# avant un rechargement se termine sur l'ancienne version
+def serving_state(request: Request) -> ServingState:
+    return getattr(request.state, "serving_state", None) or reloader.current
 
 # Création d'une classe Pydantic pour les paramètres d'entrée
 class ClientRequest(BaseModel):
     id_client: int
 
+# Paramètres du scoring par lot : des identifiants clients ou des lignes de features brutes
+class CreditBatchRequest(BaseModel):
+    ids: Optional[List[int]] = None
+    rows: Optional[List[Dict[str, Optional[float]]]] = None
+
+# Paramètres du scoring de nouveaux demandeurs : un demandeur ou une liste de demandeurs, chacun
+# donné par ses features brutes (les features absentes ou nulles prennent la médiane stockée)
+class ScoreRequest(BaseModel):
+    applicant: Optional[Dict[str, Optional[float]]] = None
+    applicants: Optional[List[Dict[str, Optional[float]]]] = None
+
 # Définition d'une route vers la racine de l'API
 @app.get("/")
 def read_root():
     return {"message": "Welcome to my FastAPI API!"}
 
-# Définition de la route pour obtenir la liste des identifiants clients
-@app.get("/client_ids")
-async def get_client_ids():
-    clients_ids =  df['SK_ID_CURR'].tolist()
-    return clients_ids
+# Politique de cache des réponses qui ne changent qu'avec la version du modèle ou des données
+PUBLIC_CACHE_CONTROL = f"public, max-age={CACHE_MAX_AGE}"
 
-# Défintion d'une route pour obtenir la liste des features
+# Définition de la route pour obtenir la liste des identifiants clients (en cache HTTP, 304 si inchangée)
+@app.get("/client_ids")
+async def get_client_ids(request: Request, current: ServingState = Depends(serving_state)):
+    clients_ids = current.cached_body("client_ids", lambda: JSONResponse(current.dataset.ids.tolist()).body)
+    return cached_response(request, clients_ids, PUBLIC_CACHE_CONTROL)
+
+# Pagination des identifiants clients par curseur (dernier identifiant reçu), dans l'ordre croissant
+@app.get("/client_ids/page")
+async def get_client_ids_page(cursor: Optional[int] = None, limit: int = Query(100, ge=1, le=CLIENT_IDS_MAX_LIMIT),
+                              current: ServingState = Depends(serving_state)):
+    ids, next_cursor = current.dataset.ids_after(cursor, limit)
+    return {"ids": ids, "next_cursor": next_cursor}
+
+# Recherche des identifiants clients commençant par un préfixe (saisie semi-automatique)
+@app.get("/client_ids/search")
+async def search_client_ids(prefix: str = Query(..., pattern=r"^\d{1,19}$"),
+                            limit: int = Query(20, ge=1, le=CLIENT_IDS_MAX_LIMIT),
+                            current: ServingState = Depends(serving_state)):
+    return {"ids": current.dataset.ids_with_prefix(prefix, limit)}
+
+# Défintion d'une route pour obtenir la liste des features (en cache HTTP, 304 si inchangée)
 @app.get("/features")
-async def get_features():
-    features = relevant_features
-    return features
-
-# Définition de la route de prédiction de crédit ("/credit/{id_client}")
-@app.get("/credit/{id_client}")
-async def predict_credit(id_client: int = Path(..., title="Client ID")):
-    # Filtre sur les données du client en question
-    X = df[df['SK_ID_CURR'] == id_client]
-    X = X[relevant_features]
-
-    # Calcul de la prédiction et de la probabilité de prédiction
-    proba = load_clf.predict_proba(X)
-    prediction = load_clf.predict(X)
-
+async def get_features(request: Request, current: ServingState = Depends(serving_state)):
+    features = current.cached_body("features", lambda: JSONResponse(current.relevant_features).body)
+    return cached_response(request, features, PUBLIC_CACHE_CONTROL)
+
+# Score d'un client servi (position et ligne de features) : lecture du score pré-calculé (probabilité
+# de la classe 0 et classe déduite via le seuil). Le client est compté dans le suivi de la dérive
+async def client_score(current, position, features):
+    with span("score_table"):
+        score = current.score_table.lookup(position)
+    with span("drift"):
+        current.drift_monitor.observe(features)
+    return score
+
+# Valeurs SHAP d'un client servi : lues directement dans le cache (mémoire ou disque) ; seuls les
+# clients jamais calculés passent par le pool SHAP
+async def client_shap_values(current, position):
+    shap_values = current.shap_cache.get_cached(position)
+    if shap_values is None:
+        shap_values = await shap_limiter.run(current.shap_cache.get, position)
+    return shap_values
+
+# Décision de crédit affichée par le dashboard à partir du score (probabilité classe 0, classe)
+def credit_decision(proba_0, prediction):
     # Afficher la probabilité avec 2 chiffres après la virgule
-    proba_formatted = round(float(proba[0][0]), 2)
+    proba_formatted = round(float(proba_0), 2)
     
     # Interprétation
     interpretation = ""
-    if prediction[0] == 0:
+    if prediction == 0:
         interpretation = f"Client solvable avec une probabilité égale à {proba_formatted}"
     else:
         interpretation = f"Client non solvable avec une probabilité égale à {proba_formatted}"
     
     # Création de la réponse de la prédiction
-    pred_proba = {
-        'Prédiction': int(prediction[0]),
+    return {
+        'Prédiction': int(prediction),
         'Probabilité': proba_formatted,
         'Conclusion': interpretation
     }
 
+# Définition de la route de prédiction de crédit ("/credit/{id_client}")
+@app.get("/credit/{id_client}")
+async def predict_credit(id_client: int = Path(..., title="Client ID"),
+                         current: ServingState = Depends(serving_state)):
+    # Sélection des features du client en question via l'index
+    with span("lookup"):
+        position = current.get_client_position(id_client)
+        features = current.features_matrix[position]
+
+    # Score et décision du client
+    pred_proba = credit_decision(*await client_score(current, position, features))
+
     # Retour de la réponse de la prédiction
-    return pred_proba
+    with span("serialize"):
+        return JSONResponse(pred_proba)
+
+# Définition de la route des statistiques de regroupement des demandeurs /score
+@app.get("/stats/batching")
+async def get_batching_stats(current: ServingState = Depends(serving_state)):
+    return current.score_batcher.stats.as_dict()
+
+# Définition de la route des statistiques des pools de calcul (concurrence, file, refus)
+@app.get("/stats/limits")
+async def get_limits_stats():
+    return {limiter.name: limiter.stats() for limiter in [model_limiter, shap_limiter, knn_limiter, data_limiter]}
+
+# Définition de la route des statistiques du cache SHAP
+@app.get("/stats/shap_cache")
+async def get_shap_cache_stats(current: ServingState = Depends(serving_state)):
+    return current.shap_cache.stats()
+
+# Définition de la route du rapport mémoire (données servies et mémoire résidente du processus)
+@app.get("/stats/memory")
+async def get_memory_stats(current: ServingState = Depends(serving_state)):
+    return {**current.memory_report, "process_rss_bytes": process_rss()}
+
+# Vérification du jeton de la route d'administration (en-tête X-Admin-Token), 403 sinon
+def check_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Administration désactivée (ADMIN_TOKEN non défini)")
+    if not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Jeton d'administration invalide")
+
+# Définition de la route de rechargement à chaud du modèle et des données : le nouvel état est
+# construit en tâche de fond puis substitué d'un bloc (un worker par appel ; avec plusieurs workers,
+# préférer la surveillance des fichiers via RELOAD_WATCH_INTERVAL)
+@app.post("/admin/reload", status_code=202, dependencies=[Depends(check_admin_token)])
+async def reload_artifacts(current: ServingState = Depends(serving_state)):
+    if not reloader.reload():
+        raise HTTPException(status_code=409, detail="Rechargement déjà en cours")
+    return {"status": "started", "model_version": current.model_version}
+
+# Définition de la route de profilage : piles de tous les threads relevées toutes les interval_ms
+# millisecondes pendant `seconds` secondes de trafic, au format « collapsed » (flamegraph.pl, speedscope)
+@app.post("/admin/profile", dependencies=[Depends(check_admin_token)], response_class=PlainTextResponse)
+async def profile_traffic(seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS),
+                          interval_ms: float = Query(5, ge=1, le=1000)):
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=403, detail="Profilage désactivé (PROFILER_ENABLED non défini)")
+    profile = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000)
+    if profile is None:
+        raise HTTPException(status_code=409, detail="Profilage déjà en cours")
+    return PlainTextResponse(profile, headers={
+        "Content-Disposition": f'attachment; filename="profile-{int(time.time())}.folded"'})
+
+# Définition de la route des mesures au format Prometheus (propres au worker qui répond)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Définition de la route des versions servies et de l'état du rechargement
+@app.get("/version")
+async def get_version(current: ServingState = Depends(serving_state)):
+    return {"model_version": current.model_version, "data_version": current.data_hash[:12], **reloader.status()}
+
+# Définition de la route de scoring par lot ("/credit/batch"), résultats en NDJSON
+@app.post("/credit/batch")
+async def predict_credit_batch(request: CreditBatchRequest, current: ServingState = Depends(serving_state)):
+    if (request.ids is None) == (request.rows is None):
+        raise HTTPException(status_code=422, detail="Renseigner soit 'ids', soit 'rows'")
+    if request.rows is not None:
+        # Validation en amont pour renvoyer une 422 avant le début du flux
+        current.check_feature_names(name for row in request.rows for name in row)
+        return model_limiter.streaming_response(current.stream_batch_rows(request.rows),
+                                                media_type="application/x-ndjson")
+    return model_limiter.streaming_response(current.stream_batch_ids(request.ids), media_type="application/x-ndjson")
+
+# Définition de la route de scoring de nouveaux demandeurs absents des données servies : probabilité,
+# classe et, avec top_k, les top_k contributions SHAP les plus fortes de chaque demandeur
+@app.post("/score")
+async def score_applicants(request: ScoreRequest, top_k: Optional[int] = Query(None, ge=1),
+                           current: ServingState = Depends(serving_state)):
+    if (request.applicant is None) == (request.applicants is None):
+        raise HTTPException(status_code=422, detail="Renseigner soit 'applicant', soit 'applicants'")
+    rows = [request.applicant] if request.applicant is not None else request.applicants
+    if not rows:
+        raise HTTPException(status_code=422, detail="Au moins un demandeur dans 'applicants'")
+    if len(rows) > BATCH_CHUNK_SIZE:
+        raise HTTPException(status_code=422, detail=f"Au plus {BATCH_CHUNK_SIZE} demandeurs (utiliser /credit/batch)")
+    with span("transform"):
+        current.check_feature_names(name for row in rows for name in row)
+        X = current.rows_to_matrix(rows)
+    with span("drift"):
+        current.drift_monitor.observe(X)
+
+    # Un demandeur seul est regroupé avec les demandeurs concurrents (un appel au modèle par lot), en
+    # tenant sa place dans la file du modèle ; une liste est scorée en un seul appel
+    with span("model"):
+        if request.applicant is not None:
+            with model_limiter.slot():
+                scores = [await current.score_batcher.submit(X[0])]
+        else:
+            scores = zip(*await model_limiter.run(current.score_matrix, X))
+    results = [{'Prédiction': int(prediction), 'Probabilité': float(proba_0)} for proba_0, prediction in scores]
+
+    if top_k is not None:
+        with span("shap"):
+            shap_values = await shap_limiter.run(current.parallel_shap_values, X)
+        for result, values in zip(results, shap_values):
+            selected = select_top_shap(values, top_k)
+            result['shap_values'] = {"features": [current.relevant_features[i] for i in selected],
+                                     "values": values[selected].tolist(),
+                                     "expected_value": current.expected_value}
+
+    with span("serialize"):
+        return JSONResponse(results[0] if request.applicant is not None else {"results": results})
 
 # Définition de la route pour récupérer les données d'un client spécifique
 @app.get("/client_data/{id_client}")
-async def get_client_data(id_client: int = Path(..., title="Client ID")):
-    # Filtrer les données du client en question
-    client_data = df[df['SK_ID_CURR'] == id_client]
+async def get_client_data(request: Request, id_client: int = Path(..., title="Client ID"), fields: Optional[str] = None,
+                          current: ServingState = Depends(serving_state)):
+    # Format de réponse négocié via l'en-tête Accept (JSON par défaut)
+    fmt = negotiate_format(request.headers.get("accept"))
+
+    # Sélection des données du client en question via l'index, restreintes aux champs demandés
+    with span("lookup"):
+        columns = current.resolve_fields(fields)
+        position = current.get_client_position(id_client)
+    with span("select"):
+        client_data = current.select_rows([position], columns)
 
-    return client_data.to_dict(orient="records")
+    with span("serialize"):
+        return await data_limiter.run(tabular_response, client_data, fmt)
 
 # Définition de la route pour récupérer les données de 1000 clients choisis de manière aléatoire
 @app.get("/all_clients_data")
-async def get_all_clients_data():
+async def get_all_clients_data(request: Request, current: ServingState = Depends(serving_state)):
+   fmt = negotiate_format(request.headers.get("accept"))
    
-   # Échantillon aléatoire de 1000 clients
-   random_clients = df.sample(n=1000, random_state=42)
+   # Échantillon aléatoire de 1000 clients, extrait et sérialisé dans le pool dédié aux données
+   def sample_records():
+       n_clients = len(current.dataset)
+       positions = np.random.RandomState(42).choice(n_clients, size=min(1000, n_clients), replace=False)
+       random_clients = current.select_rows(positions)
+       return tabular_response(random_clients, fmt)
    
-   return random_clients.to_dict(orient="records")
+   return await data_limiter.run(sample_records)
+
+# Définition de la route de distribution d'une feature sur l'ensemble des clients (histogramme,
+# densité, quantiles), avec le rang centile du client sélectionné
+@app.get("/distribution/{feature}")
+async def get_feature_distribution(feature: str, id_client: Optional[int] = None,
+                                   current: ServingState = Depends(serving_state)):
+    distributions = current.feature_distributions
+    if feature not in distributions:
+        raise HTTPException(status_code=404, detail=f"Feature {feature} inconnue")
+    distribution = dict(await data_limiter.run(distributions.summary, feature))
+
+    # Position du client sélectionné dans la distribution
+    if id_client is not None:
+        value = float(current.features_matrix[current.get_client_position(id_client), current.feature_columns[feature]])
+        distribution["client"] = {
+            "SK_ID_CURR": id_client,
+            "value": value,
+            "percentile": distributions.percentile_rank(feature, value)
+        }
+
+    return distribution
 
 # Définition de la route pour calculer les plus proches voisins du client_id
 @app.get("/nearest_neighbors/{id_client}")
-async def get_nearest_neighbors(id_client: int = Path(..., title="Client ID"), n_neighbors: int = 10):
-    # Extraction des features du client en question
-    client_data = df[df['SK_ID_CURR'] == id_client][relevant_features]
+async def get_nearest_neighbors(request: Request, id_client: int = Path(..., title="Client ID"),
+                                n_neighbors: int = Query(10, ge=1, le=KNN_MAX_NEIGHBORS),
+                                mode: Literal["exact", "approx"] = "exact",
+                                fields: Optional[str] = None, current: ServingState = Depends(serving_state)):
+    fmt = negotiate_format(request.headers.get("accept"))
 
-    # Initialisation du modèle des plus proches voisins
-    nn_model = NearestNeighbors(n_neighbors=n_neighbors)
-    
-    # Entraînement du modèle sur l'ensemble des données
-    nn_model.fit(df[relevant_features])
-    
-    # Recherche des plus proches voisins du client
-    _, indices = nn_model.kneighbors(client_data)
+    # Extraction des features du client en question
+    with span("lookup"):
+        columns = current.resolve_fields(fields)
+        position = current.get_client_position(id_client)
+        client_data = current.features_matrix[position]
+
+    # Recherche des plus proches voisins du client dans l'index pré-construit (exact ou approximatif),
+    # exécutée dans le pool dédié au kNN
+    index = current.approx_knn_index if mode == "approx" else current.knn_index
+    with span("knn"):
+        indices, _ = await knn_limiter.run(index.query, client_data, n_neighbors)
     
-    # Récupération du dataframe des plus proches voisins
-    nearest_neighbors_df = df.iloc[indices[0]]
+    # Récupération du dataframe des plus proches voisins, restreint aux champs demandés
+    with span("select"):
+        nearest_neighbors_df = current.select_rows(indices, columns)
     
-    # S'assurer que la colonne 'SK_ID_CURR' est incluse dans la réponse
-    nearest_neighbors_df = nearest_neighbors_df.reset_index(drop=True)
+        # S'assurer que la colonne 'SK_ID_CURR' est incluse dans la réponse
+        nearest_neighbors_df = nearest_neighbors_df.reset_index(drop=True)
     
-    return nearest_neighbors_df.to_dict(orient="records")
+    with span("serialize"):
+        return await data_limiter.run(tabular_response, nearest_neighbors_df, fmt)
 
 # Définition de la route pour récupérer les valeurs SHAP par client
 @app.get("/shap_values/{id_client}")
-async def get_shap_values_by_client(id_client: int = Path(..., title="Client ID")):
-    # Filtre les données du client en question
-    client_data = df[df['SK_ID_CURR'] == id_client]
-    client_data = client_data[relevant_features]
-
-    # Calcul des valeurs SHAP pour le client
-    shap_values = explainer.shap_values(client_data)
-
-    # Conversion des valeurs SHAP en un objet JSON
-    shap_values_json = {
-        "features": relevant_features,
-        "values": shap_values[0].tolist()  
-    }
-
-    return shap_values_json
-
-# Définition d'une route pour obtenir les valeurs Shap de l'ensemble des données
+async def get_shap_values_by_client(id_client: int = Path(..., title="Client ID"),
+                                    top_k: Optional[int] = Query(None, ge=1),
+                                    sign: Literal["all", "positive", "negative"] = "all",
+                                    current: ServingState = Depends(serving_state)):
+    # Sélection du client en question via l'index
+    with span("lookup"):
+        position = current.get_client_position(id_client)
+
+    # Valeurs SHAP du client, lues dans le cache ou calculées à la demande dans le pool SHAP
+    with span("shap"):
+        shap_values = await client_shap_values(current, position)
+
+    # Sélection des contributions demandées (toutes, dans l'ordre des features, par défaut)
+    with span("select"):
+        if top_k is None and sign == "all":
+            selected = np.arange(len(current.relevant_features))
+        else:
+            selected = select_top_shap(shap_values, top_k, sign)
+
+    # Conversion des valeurs SHAP en un objet JSON, avec la valeur de base et les valeurs du client
+    with span("serialize"):
+        shap_values_json = {
+            "features": [current.relevant_features[i] for i in selected],
+            "values": [shap_values[selected].tolist()],
+            "feature_values": current.features_matrix[position, selected].tolist(),
+            "expected_value": current.expected_value
+        }
+
+        return JSONResponse(shap_values_json)
+
+# Définition de la route regroupant tout ce que le dashboard affiche pour un client : décision, profil,
+# top_k contributions SHAP et, pour la variable choisie, valeurs des plus proches voisins et
+# distribution sur l'ensemble des clients. La recherche du client et sa ligne de features sont
+# partagées par tous les calculs ; SHAP et kNN s'exécutent en parallèle dans leurs pools
+@app.get("/client_bundle/{id_client}")
+async def get_client_bundle(id_client: int = Path(..., title="Client ID"), variable: Optional[str] = None,
+                            top_k: int = Query(10, ge=1),
+                            n_neighbors: int = Query(10, ge=1, le=KNN_MAX_NEIGHBORS),
+                            current: ServingState = Depends(serving_state)):
+    distributions = current.feature_distributions
+    if variable is not None and variable not in distributions:
+        raise HTTPException(status_code=404, detail=f"Feature {variable} inconnue")
+    with span("lookup"):
+        position = current.get_client_position(id_client)
+        features = current.features_matrix[position]
+
+    decision = credit_decision(*await client_score(current, position, features))
+    with span("select"):
+        profile = frame_records(current.select_rows([position], current.resolve_fields("profile")))[0]
+
+    async def shap_contributions():
+        with span("shap"):
+            shap_values = await client_shap_values(current, position)
+        selected = select_top_shap(shap_values, top_k)
+        return {"features": [current.relevant_features[i] for i in selected],
+                "values": shap_values[selected].tolist(),
+                "expected_value": current.expected_value}
+
+    async def variable_comparison():
+        column = current.feature_columns[variable]
+        value = float(features[column])
+        with span("knn"):
+            indices, _ = await knn_limiter.run(current.knn_index.query, features, n_neighbors)
+        with span("distribution"):
+            distribution = dict(await data_limiter.run(distributions.summary, variable))
+        distribution["client"] = {"SK_ID_CURR": id_client, "value": value,
+                                  "percentile": distributions.percentile_rank(variable, value)}
+        neighbors = {"SK_ID_CURR": current.dataset.ids[indices].tolist(),
+                     "values": current.features_matrix[indices, column].tolist()}
+        return neighbors, distribution
+
+    if variable is None:
+        shap_json, (neighbors, distribution) = await shap_contributions(), (None, None)
+    else:
+        shap_json, (neighbors, distribution) = await asyncio.gather(shap_contributions(), variable_comparison())
+
+    with span("serialize"):
+        return JSONResponse({
+            "SK_ID_CURR": id_client,
+            "model_version": current.model_version,
+            "decision": decision,
+            "profile": profile,
+            "shap_values": shap_json,
+            "variable": variable,
+            "neighbors": neighbors,
+            "distribution": distribution,
+        })
+
+# Définition d'une route pour obtenir l'importance globale des features (moyenne des |SHAP|
+# sur la population), calculée une seule fois et enrichie au fil du remplissage du cache SHAP
 @app.get("/shap")
-async def get_shap_values():
-    # Définir la taille du sous-échantillon
-    subsample_size = 500
-
-    # Sélectionner un sous-échantillon aléatoire du jeu de données
-    subsample = df.sample(n=subsample_size, random_state=42)
-
-    # Calculer les valeurs SHAP pour le sous-échantillon
-    shap_values_all = explainer.shap_values(subsample[relevant_features])
+async def get_shap_values(request: Request, current: ServingState = Depends(serving_state)):
+    fmt = negotiate_format(request.headers.get("accept"))
+    importance = await shap_limiter.run(current.compute_global_importance)
+
+    # En Arrow : table du classement, les informations de calcul dans les métadonnées du schéma
+    def build_body():
+        if fmt == "arrow":
+            metadata = {key: importance[key] for key in ["sample_size", "population_size", "model_version"]}
+            return tabular_response(pd.DataFrame(importance["ranking"]), fmt, metadata).body
+        if fmt == "msgpack":
+            return object_response(importance, fmt).body
+        return JSONResponse(importance).body
+
+    # Corps mis en cache par format et taille d'échantillon ; à revalider tant que l'échantillon grossit
+    body = current.cached_body(f"shap.{fmt}", build_body, MEDIA_TYPES_BY_FORMAT[fmt], extra=[importance["sample_size"]])
+    complete = importance["sample_size"] >= importance["population_size"]
+    return cached_response(request, body, PUBLIC_CACHE_CONTROL if complete else "no-cache")
+
+# Définition de la route de suivi de la dérive des données : indicateurs par feature (PSI, KS,
+# Jensen-Shannon) entre la population de référence et les clients scorés, par fenêtre de temps
+@app.get("/data_drift")
+async def get_data_drift(window: Optional[str] = None, top_k: Optional[int] = Query(None, ge=1),
+                         current: ServingState = Depends(serving_state)):
+    if window is not None and window not in {*DRIFT_WINDOWS, "all"}:
+        raise HTTPException(status_code=422, detail=f"Fenêtre inconnue : {window} ({sorted({*DRIFT_WINDOWS, 'all'})})")
+    return current.drift_monitor.report(window, top_k)
 
-    # Conversion des valeurs Shap en un objet JSON
-    shap_values_json_all = {
-        "features": relevant_features,
-        "values": shap_values_all[0].tolist()
-    }
-
-    return shap_values_json_all
-
-from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path 
 # Chemin vers le fichier HTML de dérive des données
@@ -172,7 +882,19 @@ data_drift_file_path = Path("./data_drift.html")
 # Définissez le dossier statique pour les fichiers HTML
 app.mount("/static", StaticFiles(directory=str(data_drift_file_path.parent), html=True), name="static")
 
-# Route pour récupérer le fichier de dérive des données
+# Contenu du rapport de dérive en cache, relu quand le fichier change
+data_drift_cache = {}
+
+# Route pour récupérer le fichier de dérive des données (en cache HTTP, 304 si inchangé)
 @app.get("/data_drift_html")
-async def get_data_drift_html():
-    return FileResponse(data_drift_file_path, media_type="text/html")
\ No newline at end of file
+async def get_data_drift_html(request: Request):
+    try:
+        stat = os.stat(data_drift_file_path)
+    except OSError:
+        raise HTTPException(status_code=404, detail="Rapport de dérive introuvable")
+    etag = weak_etag("data_drift", stat.st_size, stat.st_mtime_ns)
+    cached = data_drift_cache.get("html")
+    if cached is None or cached.etag != etag:
+        cached = CachedBody(data_drift_file_path.read_bytes(), "text/html", etag, stat.st_mtime)
+        data_drift_cache["html"] = cached
+    return cached_response(request, cached, PUBLIC_CACHE_CONTROL)
\ No newline at end of file
@@ -1,7 +1,8 @@
 # Importation des bibliothèques
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import requests
 import pandas as pd
@@ -10,20 +11,55 @@ import json
 
 
 
-# Récupération des IDs clients depuis l'API
-def get_client_ids():
-    api_url = "https://fastapi-scoring-304b8bfde103.herokuapp.com/client_ids"
-    response = requests.get(api_url)
+# Réponses déjà reçues des routes peu changeantes de l'API, revalidées par requête conditionnelle
+# (If-None-Match) : l'API répond 304 sans corps tant que le modèle et les données n'ont pas changé
+api_cache = {}
+
+def get_with_revalidation(api_url):
+    cached = api_cache.get(api_url)
+    response = requests.get(api_url, headers={"If-None-Match": cached.headers["ETag"]} if cached else {})
+    if response.status_code == 304 and cached is not None:
+        return cached
+    if response.status_code == 200 and "ETag" in response.headers:
+        api_cache[api_url] = response
+    return response
+
+# Première page des IDs clients, proposée avant toute saisie
+def get_client_ids_page(limit=100):
+    api_url = "https://fastapi-scoring-304b8bfde103.herokuapp.com/client_ids/page"
+    response = requests.get(api_url, params={"limit": limit})
 
     if response.status_code == 200:
-        return response.json()
+        return response.json()["ids"]
+    else:
+        return []
+
+# Recherche des IDs clients commençant par le préfixe saisi
+def search_client_ids(prefix, limit=20):
+    api_url = "https://fastapi-scoring-304b8bfde103.herokuapp.com/client_ids/search"
+    response = requests.get(api_url, params={"prefix": prefix, "limit": limit})
+
+    if response.status_code == 200:
+        return response.json()["ids"]
     else:
         return []
 
+# Données d'un client pour tout le tableau de bord en une requête (décision, profil, valeurs SHAP et,
+# pour la variable choisie, plus proches voisins et distribution) ; {} si le client est introuvable
+def get_client_bundle(client_id, variable=None):
+    api_url = f"https://fastapi-scoring-304b8bfde103.herokuapp.com/client_bundle/{client_id}"
+    params = {"top_k": 10, **({"variable": variable} if variable else {})}
+    response = requests.get(api_url, params=params)
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        return {}
+
 # Récupération de la liste des features
 def get_features():
     api_url = "https://fastapi-scoring-304b8bfde103.herokuapp.com/features"
-    response = requests.get(api_url)
+    response = get_with_revalidation(api_url)
 
     if response.status_code == 200:
         return response.json()
@@ -65,9 +101,11 @@ sidebar = html.Div(
                     html.P('Idendifiant client',
                            style={'marginTop': '8px', 'marginBottom': '4px', 'textAlign': 'center', "fontSize" : "14px"},
                            className='fontWeight-bold'),
+                    # Options chargées à la saisie (recherche par préfixe dans l'API)
                     dcc.Dropdown(id='client-dropdown', multi=False,
                                  options=[{'label': str(client_id), 'value': client_id}
-                        for client_id in get_client_ids()],
+                        for client_id in get_client_ids_page()],
+                                 placeholder="Saisir un identifiant",
                                  style={'width': '280'}
                                  ),
                     # Sélection de la variable pour la comparaison avec les autres clients
@@ -109,6 +147,8 @@ sidebar = html.Div(
 # Définition du contenu principal de l'application
 content = html.Div(
     [
+        # Données du client sélectionné, partagées par tous les graphiques
+        dcc.Store(id='client-bundle'),
         dbc.Row(
             [
                 dbc.Col(
@@ -218,22 +258,50 @@ app.layout = dbc.Container(
 )
 
 
+# Chargement des options de la liste des clients à la saisie : seuls les IDs commençant par le texte
+# saisi sont demandés à l'API ; le client sélectionné reste dans les options
+@app.callback(
+    Output('client-dropdown', 'options'),
+    Input('client-dropdown', 'search_value'),
+    State('client-dropdown', 'value')
+)
+
+def update_client_options(search_value, client_id):
+    if not search_value:
+        raise PreventUpdate
+    client_ids = search_client_ids(search_value.strip()) if search_value.strip().isdigit() else []
+    if client_id is not None and client_id not in client_ids:
+        client_ids = [client_id] + client_ids
+    return [{'label': str(client_id), 'value': client_id} for client_id in client_ids]
+
+
+# Chargement des données du client sélectionné en une seule requête à l'API, à chaque changement de
+# client ou de variable ; les autres callbacks lisent ces données partagées
+@app.callback(
+    Output('client-bundle', 'data'),
+    Input('client-dropdown', 'value'),
+    Input('variable-dropdown', 'value')
+)
+
+def update_client_bundle(client_id, variable):
+    if client_id is None:
+        return None
+    return get_client_bundle(client_id, variable)
+
+
 # Fonction pour afficher les informations du client avec Plotly
 @app.callback(
     Output('client-info-output', 'children'),
-    [Input('client-dropdown', 'value')]
+    [Input('client-bundle', 'data')]
 )
 
-def display_client_info(client_id):
-    if client_id is None:
+def display_client_info(bundle):
+    if bundle is None:
         return ""
 
-    # Appel de l'API pour obtenir les informations du client
-    api_url = f"https://fastapi-scoring-304b8bfde103.herokuapp.com/client_data/{client_id}"
-    response = requests.get(api_url)
-
-    if response.status_code == 200:
-        client_data = response.json()
+    # Informations du client (seuls les champs du profil affiché)
+    if bundle:
+        client_data = [bundle["profile"]]
 
         # Création d'un dataframe à partir des données du client
         df_client = pd.DataFrame(client_data)
@@ -309,22 +377,19 @@ def display_client_info(client_id):
 # Fonction pour afficher la décision de crédit
 @app.callback(
     Output('credit-decision-output', 'children'),
-    [Input('client-dropdown', 'value')]
+    [Input('client-bundle', 'data')]
 )
-def generate_credit_decision(client_id):
+def generate_credit_decision(bundle):
     """
-    Génère la décision de crédit en fonction de l'ID du client sélectionné.
+    Génère la décision de crédit du client sélectionné à partir de ses données partagées.
     Affiche le score du client en pourcentage et colore la décision en vert si le crédit est accordé, en rouge sinon.
     """
-    if client_id is None:
+    if bundle is None:
         return ""
 
-    # Appel de l'API pour obtenir la décision de crédit
-    api_url = f"https://fastapi-scoring-304b8bfde103.herokuapp.com/credit/{client_id}"
-    response = requests.get(api_url)
-
-    if response.status_code == 200:
-        API_data = response.json()
+    # Décision de crédit reçue avec les données du client
+    if bundle:
+        API_data = bundle['decision']
         classe_predite = API_data['Prédiction']
         proba = 1 - API_data['Probabilité']
         client_score = round(proba * 100, 2)
@@ -372,28 +437,20 @@ def generate_credit_decision(client_id):
 @app.callback(
     Output("nearest-neighbors-plot", "figure"),
     Input("my-button", "n_clicks"),
-    Input("client-dropdown", "value"),
-    Input("variable-dropdown", "value"),
+    Input("client-bundle", "data"),
     Input("info-checklist", "value"),
 )
-def update_nearest_neighbors_plot(n_clicks, selected_client, selected_variable, selected_info):
-    if n_clicks is None or not selected_client or not selected_variable or "comparison" not in selected_info:
+def update_nearest_neighbors_plot(n_clicks, bundle, selected_info):
+    if n_clicks is None or not bundle or not bundle["variable"] or "comparison" not in selected_info:
         # Si le bouton n'a pas été cliqué ou les sélections ne sont pas complètes, retournez une figure vide
         return go.Figure()
-    
-    # Appeler l'API pour obtenir les données du client sélectionné
-    client_data_response = requests.get(f"https://fastapi-scoring-304b8bfde103.herokuapp.com/client_data/{selected_client}")
-    client_data = client_data_response.json()
-
-    # Appeler l'API pour obtenir les plus proches voisins
-    neighbors_data_response = requests.get(f"https://fastapi-scoring-304b8bfde103.herokuapp.com/nearest_neighbors/{selected_client}")
-    neighbors_data = neighbors_data_response.json()
+    selected_client, selected_variable = bundle["SK_ID_CURR"], bundle["variable"]
     
     # Extraire les identifiants clients et les valeurs de la variable sélectionnée pour le client sélectionné et ses voisins
-    client_id = client_data[0]["SK_ID_CURR"]
-    client_value = client_data[0][selected_variable]
-    neighbors_ids = [data["SK_ID_CURR"] for data in neighbors_data]
-    neighbors_values = [data[selected_variable] for data in neighbors_data]
+    client_id = selected_client
+    client_value = bundle["distribution"]["client"]["value"]
+    neighbors_ids = bundle["neighbors"]["SK_ID_CURR"]
+    neighbors_values = bundle["neighbors"]["values"]
     
     # Créer un displot
     fig = go.Figure()
@@ -413,41 +470,32 @@ def update_nearest_neighbors_plot(n_clicks, selected_client, selected_variable,
     
     return fig
 
-import plotly.figure_factory as ff
 @app.callback(
     Output("comparison-to-all-clients-plot", "figure"),
     Input("my-button", "n_clicks"),
-    Input("client-dropdown", "value"),
-    Input("variable-dropdown", "value"),
+    Input("client-bundle", "data"),
     Input("info-checklist", "value"),
 )
-def update_comparison_to_all_clients_plot(n_clicks, selected_client, selected_variable, selected_info):
-    if n_clicks is None or not selected_client or not selected_variable or "comparison_all" not in selected_info:
+def update_comparison_to_all_clients_plot(n_clicks, bundle, selected_info):
+    if n_clicks is None or not bundle or not bundle["variable"] or "comparison_all" not in selected_info:
         # Si le bouton n'a pas été cliqué ou les sélections ne sont pas complètes, retournez une figure vide
         return go.Figure()
+    selected_client, selected_variable = bundle["SK_ID_CURR"], bundle["variable"]
 
-    # Appeler l'API pour obtenir les données du client sélectionné
-    client_data_response = requests.get(f"https://fastapi-scoring-304b8bfde103.herokuapp.com/client_data/{selected_client}")
-    client_data = client_data_response.json()
-
-    # Appeler l'API pour obtenir l'ensemble des données clients
-    all_clients_data_response = requests.get("https://fastapi-scoring-304b8bfde103.herokuapp.com/all_clients_data")
-    all_clients_data = all_clients_data_response.json()
+    # Distribution pré-calculée de la variable sur l'ensemble des clients, avec la valeur et le rang
+    # centile du client sélectionné
+    distribution = bundle["distribution"]
+    client_value = distribution["client"]["value"]
+    client_percentile = distribution["client"]["percentile"]
 
-    # Extraire les identifiants clients et les valeurs de la variable sélectionnée pour le client sélectionné et l'ensemble des clients
-    client_value = client_data[0][selected_variable]
-    all_clients_values = [data[selected_variable] for data in all_clients_data]
-
-    # Créer un distplot
-    fig = ff.create_distplot(
-        [all_clients_values],
-        group_labels=["Tous les clients"],
-        show_hist=False,
-        show_rug=True
-    )
+    # Créer la courbe de densité de l'ensemble des clients
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=distribution["kde"]["x"], y=distribution["kde"]["y"], mode='lines',
+                             fill='tozeroy', name="Tous les clients"))
 
     # Ajouter la valeur du client sélectionné
-    fig.add_trace(go.Scatter(x=[client_value], mode='markers', name="Client sélectionné"))
+    fig.add_trace(go.Scatter(x=[client_value], y=[0], mode='markers', marker={'size': 12},
+                             name=f"Client sélectionné ({client_percentile:.0f}e centile)"))
 
     # Mettre en forme le graphique
     fig.update_layout(
@@ -467,30 +515,21 @@ def update_comparison_to_all_clients_plot(n_clicks, selected_client, selected_va
     Output('shap-client', 'figure'),
     Input('my-button', 'n_clicks'),
     Input('info-checklist', 'value'),
-    Input('client-dropdown', 'value'),
-    Input('variable-dropdown', 'value')
+    Input('client-bundle', 'data')
 )
-def update_shap_waterfall(n_clicks, info_checklist, client_id, variable):
+def update_shap_waterfall(n_clicks, info_checklist, bundle):
     if 'decision' in info_checklist and n_clicks > 0:
-        if client_id is not None and variable is not None:
-            # Faites une requête à l'API pour récupérer les valeurs SHAP
-            api_url = f"https://fastapi-scoring-304b8bfde103.herokuapp.com/shap_values/{client_id}"
-            response = requests.get(api_url)
-
-            if response.status_code == 200:
-                shap_values_json = response.json()
-                features = shap_values_json["features"]
-                values = shap_values_json["values"]
+        if bundle and bundle["variable"] is not None:
+            client_id = bundle["SK_ID_CURR"]
 
-                # Triez les valeurs SHAP par ordre décroissant
-                sorted_shap_values = sorted(zip(features, values[0]), key=lambda x: abs(x[1]), reverse=True)
-
-
-                # Sélectionnez les 10 valeurs SHAP les plus importantes
-                top_10_shap_values = sorted_shap_values[:10]
+            # Valeurs SHAP reçues avec les données du client
+            # (seules les 10 valeurs les plus importantes, déjà triées par l'API)
+            if bundle["shap_values"]:
+                shap_values_json = bundle["shap_values"]
 
                 # Séparez les noms de variables et les valeurs
-                variable_names, shap_scores = zip(*top_10_shap_values)
+                variable_names = shap_values_json["features"]
+                shap_scores = shap_values_json["values"]
 
                 # Créez un graphique Waterfall avec des barres rouges et bleues
                 fig = go.Figure(go.Waterfall(
@@ -526,18 +565,14 @@ def update_shap_values_plot(n_clicks, info_checklist):
     if 'importance' in info_checklist and n_clicks > 0:
         # Faites une requête à l'API pour récupérer les valeurs SHAP pour l'ensemble du jeu de données
         api_url = "https://fastapi-scoring-304b8bfde103.herokuapp.com/shap"
-        response = requests.get(api_url)
+        response = get_with_revalidation(api_url)
 
         if response.status_code == 200:
             shap_values_json_all = response.json()
-            features = shap_values_json_all["features"]
-            values = shap_values_json_all["values"]
-
-            # Triez les valeurs SHAP par ordre décroissant
-            sorted_shap_values = sorted(zip(features, values[0]), key=lambda x: abs(x[1]), reverse=True)
 
-            # Sélectionnez les 10 valeurs SHAP les plus importantes
-            top_10_shap_values = sorted_shap_values[:10]
+            # Sélectionnez les 10 variables les plus importantes (classement déjà calculé par l'API)
+            top_10_shap_values = [(item["feature"], item["mean_abs_shap"])
+                                  for item in shap_values_json_all["ranking"][:10]]
 
             # Séparez les noms de variables et les valeurs
             variable_names, shap_scores = zip(*top_10_shap_values)
@@ -554,7 +589,8 @@ def update_shap_values_plot(n_clicks, info_checklist):
             ))
 
             fig.update_layout(
-                title="Valeurs SHAP les plus importantes pour l'ensemble du jeu de données",
+                title=f"Valeurs SHAP les plus importantes pour l'ensemble du jeu de données "
+                      f"({shap_values_json_all['sample_size']} clients)",
                 xaxis_title="Variables",
                 yaxis_title="SHAP Values"
             )
@@ -563,7 +599,9 @@ def update_shap_values_plot(n_clicks, info_checklist):
 
     return go.Figure()
 
-# Callback pour afficher le graphique de dérive des données
+# Callback pour afficher le graphique de dérive des données : PSI des features les plus en dérive
+# sur la dernière heure (ou depuis le démarrage si l'API n'a pas de fenêtre "1h"), calculé par
+# l'API à partir des clients scorés
 @app.callback(
     Output('data-drift-plot-container', 'children'),
     Input('my-button', 'n_clicks'),
@@ -571,17 +609,26 @@ def update_shap_values_plot(n_clicks, info_checklist):
 )
 def update_data_drift_plot(n_clicks, info_checklist):
     if 'drift' in info_checklist and n_clicks > 0:
-        # Faites une requête à l'API FastAPI pour obtenir les données de dérive des données
-        api_url = "https://fastapi-scoring-304b8bfde103.herokuapp.com/data_drift_html"
-        response = requests.get(api_url)
+        # Faites une requête à l'API FastAPI pour obtenir les indicateurs de dérive des données
+        api_url = "https://fastapi-scoring-304b8bfde103.herokuapp.com/data_drift"
+        # Toutes les fenêtres configurées sur le serveur (DRIFT_WINDOWS) sont renvoyées
+        response = requests.get(api_url, params={"top_k": 20})
 
         if response.status_code == 200:
-            drift_html_content = response.text
-
-            # Intégrez le contenu HTML dans la page Dash
-            drift_plot = html.Div([html.Iframe(srcDoc=drift_html_content, width='100%', height='600')])
-
-            return drift_plot
+            windows = response.json()["metrics"]
+            window = "1h" if "1h" in windows else "all"
+            drift = windows[window]
+            period = "sur la dernière heure" if window == "1h" else "depuis le démarrage de l'API"
+            features = list(drift["features"])[::-1]
+            psi = [drift["features"][feature]["psi"] for feature in features]
+            colors = ['red' if drift["features"][feature]["drift"] else 'steelblue' for feature in features]
+
+            fig = go.Figure(go.Bar(x=psi, y=features, orientation='h', marker_color=colors))
+            fig.update_layout(title=f"Dérive des données {period} ({drift['rows']} clients scorés, "
+                                    f"{drift['drifted_features']} features en dérive)",
+                              xaxis_title="PSI", height=600)
+
+            return html.Div([dcc.Graph(figure=fig)])
 
     return html.Div()
 
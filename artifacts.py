@@ -0,0 +1,48 @@
+# Utilitaires communs aux artefacts pré-calculés (index, caches) stockés à côté des données
+import fcntl
+import hashlib
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# Calcul de l'empreinte SHA-256 d'un fichier, lu par blocs pour borner la mémoire
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Chemin d'un artefact dérivé d'un fichier source (ex : test_df.parquet -> test_df.knn.npy)
+def artifact_path(source_path, suffix):
+    source_path = Path(source_path)
+    return source_path.with_name(f"{source_path.stem}.{suffix}")
+
+
+# Écriture atomique : le fichier est écrit à côté puis renommé, pour que plusieurs workers
+# ne lisent jamais un artefact à moitié écrit
+def atomic_write(path, write_fn):
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            write_fn(f)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+# Verrou exclusif (fichier test_df.build.lock) autour de la construction des artefacts d'une source :
+# les workers qui rechargent en même temps attendent le premier puis chargent ce qu'il a construit,
+# au lieu de refaire le même calcul et de remplacer des fichiers déjà mappés par les autres
+@contextmanager
+def artifact_lock(source_path):
+    with open(artifact_path(source_path, "build.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
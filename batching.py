@@ -0,0 +1,93 @@
+# Regroupement (micro-batching) des requêtes de scoring concurrentes
+import asyncio
+import threading
+import time
+
+import numpy as np
+
+
+class BatchingStats:
+    """Statistiques cumulées du regroupement : taille des lots et attente en file."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.max_batch_size = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, batch_size, waits):
+        with self._lock:
+            self.batches += 1
+            self.requests += batch_size
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.total_wait += sum(waits)
+            self.max_wait = max(self.max_wait, max(waits))
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "max_batch_size": self.max_batch_size,
+                "mean_queue_wait_ms": 1000 * self.total_wait / self.requests if self.requests else 0.0,
+                "max_queue_wait_ms": 1000 * self.max_wait,
+            }
+
+
+class MicroBatcher:
+    """Met en file les lignes soumises pendant une courte fenêtre (ou jusqu'à max_batch_size)
+    puis les score en un seul appel à predict_fn ; chaque appelant reçoit son propre résultat.
+
+    predict_fn reçoit une matrice (une ligne par requête) et renvoie une séquence de résultats
+    dans le même ordre. Elle est exécutée hors de la boucle asyncio.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.002, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+        self.stats = BatchingStats()
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    # Soumission d'une ligne de features, renvoie le résultat de predict_fn pour cette ligne
+    async def submit(self, row):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    # Envoi du lot courant au modèle
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        started = time.perf_counter()
+        self.stats.record(len(batch), [started - enqueued for _, _, enqueued in batch])
+        rows = np.vstack([row for row, _, _ in batch])
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.predict_fn, rows)
+        except Exception as exc:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,277 @@
+# Suite de benchmarks de l'API : lancement local sur un jeu synthétique de la taille choisie, charge
+# sur chaque route à concurrence fixée, puis latences (p50/p95/p99), débit, temps de démarrage et
+# mémoire résidente maximale écrits en JSON et comparés à une référence
+#
+# Utilisation : python benchmarks/bench_api.py [--rows 10000] [--concurrency 8] [--duration 5]
+#               [--routes credit shap_values ...] [--workers 1] [--output resultat.json]
+#               [--baseline benchmarks/baseline.json] [--threshold 0.2]
+#
+# Code de sortie 1 si une mesure régresse de plus de --threshold par rapport à la référence.
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from synthetic_data import make_synthetic_data  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Mesures comparées à la référence : (chemin dans le résultat, sens de l'amélioration)
+LOWER_IS_BETTER, HIGHER_IS_BETTER = -1, 1
+ROUTE_CHECKS = {"p95_ms": LOWER_IS_BETTER, "p99_ms": LOWER_IS_BETTER, "throughput_rps": HIGHER_IS_BETTER}
+GLOBAL_CHECKS = {("startup", "cold_s"): LOWER_IS_BETTER, ("startup", "warm_s"): LOWER_IS_BETTER,
+                 ("peak_rss_mb",): LOWER_IS_BETTER}
+
+
+# Scénarios : méthode, chemin et corps d'une requête à partir d'un identifiant client tiré au hasard
+def scenarios(features, client_ids):
+    applicant = {feature: 0.0 for feature in features[:20]}
+    batch_ids = random.Random(0).sample(client_ids, min(100, len(client_ids)))
+    return {
+        "root": lambda client_id: ("GET", "/", None),
+        "client_ids": lambda client_id: ("GET", "/client_ids", None),
+        "client_ids_page": lambda client_id: ("GET", f"/client_ids/page?cursor={client_id}&limit=100", None),
+        "client_ids_search": lambda client_id: ("GET", f"/client_ids/search?prefix={str(client_id)[:3]}", None),
+        "features": lambda client_id: ("GET", "/features", None),
+        "credit": lambda client_id: ("GET", f"/credit/{client_id}", None),
+        "credit_batch": lambda client_id: ("POST", "/credit/batch", {"ids": batch_ids}),
+        "score": lambda client_id: ("POST", "/score", {"applicant": applicant}),
+        "client_data": lambda client_id: ("GET", f"/client_data/{client_id}", None),
+        "all_clients_data": lambda client_id: ("GET", "/all_clients_data", None),
+        "distribution": lambda client_id: ("GET", f"/distribution/{features[0]}?id_client={client_id}", None),
+        "nearest_neighbors": lambda client_id: ("GET", f"/nearest_neighbors/{client_id}", None),
+        "shap_values": lambda client_id: ("GET", f"/shap_values/{client_id}?top_k=10", None),
+        "client_bundle": lambda client_id: ("GET", f"/client_bundle/{client_id}?variable={features[0]}", None),
+        "shap": lambda client_id: ("GET", "/shap", None),
+        "data_drift": lambda client_id: ("GET", "/data_drift?top_k=20", None),
+        "metrics": lambda client_id: ("GET", "/metrics", None),
+    }
+
+
+# Mémoire résidente maximale (Mo) depuis le démarrage du processus et de ses enfants (workers)
+def peak_rss_mb(pid):
+    total = 0
+    for process in [pid, *child_pids(pid)]:
+        try:
+            with open(f"/proc/{process}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+class Server:
+    """API lancée dans un sous-processus (uvicorn, ou gunicorn si workers > 1) sur le jeu de données donné."""
+
+    def __init__(self, data_path, port, workers=1):
+        self.port = port
+        env = {**os.environ, "DATA_PATH": str(data_path), "SHAP_CACHE_BACKGROUND_FILL": "0",
+               "PORT": str(port), "WEB_CONCURRENCY": str(workers)}
+        if workers > 1:
+            command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn_api_conf.py", "API:app"]
+        else:
+            command = [sys.executable, "-m", "uvicorn", "API:app", "--port", str(port), "--log-level", "warning"]
+        self.started = time.perf_counter()
+        self.process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL)
+
+    # Attente de la première réponse ; renvoie le temps de démarrage (s)
+    def wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Le serveur s'est arrêté au démarrage (code {self.process.returncode})")
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=5)
+                connection.request("GET", "/")
+                if connection.getresponse().status == 200:
+                    return time.perf_counter() - self.started
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("Le serveur n'a pas démarré")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+# Charge sur un scénario depuis `concurrency` connexions persistantes pendant `duration` s
+def run_scenario(port, scenario, client_ids, concurrency, duration, seed=0):
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    deadline = time.monotonic() + duration
+
+    def run(slot):
+        rng = random.Random(seed + slot)
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        while time.monotonic() < deadline:
+            method, path, body = scenario(rng.choice(client_ids))
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            start = time.perf_counter()
+            try:
+                connection.request(method, path, body=None if body is None else json.dumps(body), headers=headers)
+                response = connection.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                ok = False
+            latencies[slot].append(time.perf_counter() - start)
+            if not ok:
+                errors[slot] += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    timings = np.array([latency for slot in latencies for latency in slot]) * 1000
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) if len(timings) else (np.nan,) * 3
+    return {"requests": int(len(timings)), "errors": int(sum(errors)), "throughput_rps": len(timings) / elapsed,
+            "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+            "mean_ms": float(timings.mean()) if len(timings) else float("nan")}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+# Écarts relatifs au-delà du seuil, dans le sens défavorable, entre un résultat et la référence
+def regressions(result, baseline, threshold):
+    found = []
+
+    def check(name, value, reference, direction):
+        if value is None or reference is None or not reference:
+            return
+        change = (value - reference) / reference
+        if -direction * change > threshold:
+            found.append(f"{name} : {reference:.4g} -> {value:.4g} ({change:+.0%})")
+
+    for path, direction in GLOBAL_CHECKS.items():
+        value, reference = result, baseline
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+            reference = reference.get(key) if isinstance(reference, dict) else None
+        check(".".join(path), value, reference, direction)
+    for route, measures in result["routes"].items():
+        reference = baseline.get("routes", {}).get(route)
+        # Une route en erreur répond vite : son taux d'erreur est comparé avant toute mesure de vitesse
+        error_rate = measures["errors"] / max(measures["requests"], 1)
+        reference_rate = reference["errors"] / max(reference["requests"], 1) if reference else 0.0
+        if measures["errors"] and error_rate > reference_rate:
+            found.append(f"{route}.errors : {measures['errors']} / {measures['requests']} requêtes "
+                         f"({error_rate:.1%}, référence {reference_rate:.1%})")
+        if reference is None:
+            continue
+        for key, direction in ROUTE_CHECKS.items():
+            check(f"{route}.{key}", measures.get(key), reference.get(key), direction)
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des routes de l'API sur un jeu synthétique")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--warmup", type=float, default=1)
+    parser.add_argument("--routes", nargs="+", default=None)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--startup-timeout", type=float, default=3600)
+    parser.add_argument("--keep-artifacts", action="store_true",
+                        help="ne pas supprimer les artefacts existants avant le démarrage à froid")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    data_path = make_synthetic_data(args.rows)
+    client_ids = pq.read_table(data_path, columns=["SK_ID_CURR"]).column(0).to_pylist()
+    features = [name for name in pq.read_schema(data_path).names
+                if name not in ("Unnamed: 0", "SK_ID_CURR", "INDEX", "TARGET")]
+    routes = scenarios(features, client_ids)
+    selected = args.routes or list(routes)
+
+    # Démarrage à froid (artefacts supprimés puis reconstruits) puis à chaud (artefacts mappés), sur
+    # lequel porte la charge
+    if not args.keep_artifacts:
+        for artifact in data_path.parent.glob(f"{data_path.stem}.*"):
+            if artifact != data_path:
+                artifact.unlink()
+    cold = Server(data_path, args.port, args.workers)
+    try:
+        cold_s = cold.wait_ready(args.startup_timeout)
+    finally:
+        cold.stop()
+    server = Server(data_path, args.port, args.workers)
+    try:
+        warm_s = server.wait_ready(args.startup_timeout)
+        print(f"démarrage : {cold_s:.1f} s à froid, {warm_s:.1f} s à chaud ({args.rows} clients)")
+        print(f"{'route':<20}{'req/s':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'erreurs':>9}")
+        results = {}
+        for name in selected:
+            run_scenario(args.port, routes[name], client_ids, args.concurrency, args.warmup)
+            results[name] = run_scenario(args.port, routes[name], client_ids, args.concurrency, args.duration)
+            measures = results[name]
+            print(f"{name:<20}{measures['throughput_rps']:>10.0f}{measures['p50_ms']:>10.1f}"
+                  f"{measures['p95_ms']:>10.1f}{measures['p99_ms']:>10.1f}{measures['errors']:>9}")
+        peak_rss = peak_rss_mb(server.process.pid)
+    finally:
+        server.stop()
+
+    result = {
+        "meta": {"date": datetime.now(timezone.utc).isoformat(), "commit": git_commit(), "rows": args.rows,
+                 "concurrency": args.concurrency, "duration_s": args.duration, "workers": args.workers,
+                 "cpu_count": os.cpu_count(), "python": platform.python_version(), "machine": platform.machine()},
+        "startup": {"cold_s": cold_s, "warm_s": warm_s},
+        "peak_rss_mb": peak_rss,
+        "routes": results,
+    }
+    print(f"mémoire résidente maximale : {peak_rss:.0f} Mo")
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"bench_api_{args.rows}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+    print(f"résultats : {output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("meta", {}).get("rows") != args.rows:
+            print(f"attention : référence mesurée sur {baseline.get('meta', {}).get('rows')} clients")
+        found = regressions(result, baseline, args.threshold)
+        for regression in found:
+            print(f"RÉGRESSION {regression}")
+        if found:
+            sys.exit(1)
+        print(f"aucune régression au-delà de {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Benchmark des formats de réponse des routes tabulaires : temps d'encodage et taille par format
+#
+# Utilisation : python benchmarks/bench_formats.py [--data test_df.parquet] [--rows 1 10 1000]
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from formats import msgpack, pa, tabular_response  # noqa: E402
+
+
+# Encodage historique : to_dict puis encodeur générique de FastAPI et json.dumps
+def encode_legacy_json(frame):
+    return json.dumps(jsonable_encoder(frame.to_dict(orient="records"))).encode()
+
+
+# Temps moyen (ms) et taille (octets) d'un encodage sur plusieurs répétitions
+def measure(encode, frame, repeat):
+    body = encode(frame)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode(frame)
+    return 1000 * (time.perf_counter() - start) / repeat, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des formats de réponse tabulaires")
+    parser.add_argument("--data", default="test_df.parquet")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 10, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    df = pd.read_parquet(args.data)
+    encoders = {"json (to_dict + jsonable_encoder)": encode_legacy_json,
+                "json (pandas to_json)": lambda frame: tabular_response(frame, "json").body}
+    if msgpack is not None:
+        encoders["msgpack"] = lambda frame: tabular_response(frame, "msgpack").body
+    if pa is not None:
+        encoders["arrow ipc stream"] = lambda frame: tabular_response(frame, "arrow").body
+
+    print(f"{'lignes':>8}  {'format':<36}{'encodage (ms)':>16}{'taille (ko)':>14}")
+    for n_rows in args.rows:
+        frame = df.sample(n=min(n_rows, len(df)), random_state=42)
+        for name, encode in encoders.items():
+            elapsed, size = measure(encode, frame, args.repeat)
+            print(f"{n_rows:>8}  {name:<36}{elapsed:>16.2f}{size / 1024:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Benchmark du scoring : LGBMClassifier.predict_proba (interface scikit-learn) comparé au moteur natif
+# (inference.NativeBoosterEngine), temps par appel selon le nombre de lignes
+#
+# Utilisation : python benchmarks/bench_inference.py [--model LGBMClassifier.pkl] [--data test_df.parquet]
+#               [--rows 1 8 64 1024] [--threads 1]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from inference import NativeBoosterEngine  # noqa: E402
+from preprocessing import PreprocessedData  # noqa: E402
+
+
+# Temps par appel (µs) : médiane et 99e centile sur `repeat` appels
+def measure(predict, X, repeat):
+    predict(X)
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        predict(X)
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, [50, 99]) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du scoring scikit-learn / moteur natif")
+    parser.add_argument("--model", default="LGBMClassifier.pkl")
+    parser.add_argument("--data", default="test_df.parquet")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 8, 64, 1024])
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    features = PreprocessedData.load_or_build(args.data).features
+    engines = {"sklearn predict_proba": model.predict_proba,
+               "natif": NativeBoosterEngine(model.booster_, num_threads=args.threads).predict_proba}
+
+    print(f"{'lignes':>8}  {'moteur':<24}{'p50 (µs)':>12}{'p99 (µs)':>12}{'µs/ligne':>12}")
+    for n_rows in args.rows:
+        X = features[:n_rows]
+        repeat = max(5, args.repeat * 8 // max(n_rows, 8))
+        for name, predict in engines.items():
+            p50, p99 = measure(predict, X, repeat)
+            print(f"{n_rows:>8}  {name:<24}{p50:>12.0f}{p99:>12.0f}{p50 / n_rows:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
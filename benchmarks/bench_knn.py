@@ -0,0 +1,80 @@
+# Benchmark des plus proches voisins : rappel@k et requêtes par seconde des modes exact
+# et approximatif, comparés au résultat de NearestNeighbors de scikit-learn
+#
+# Utilisation : python benchmarks/bench_knn.py [--data test_df.parquet] [--k 10] [--queries 200]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import NearestNeighbors
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from knn_index import ApproxKnnIndex, KnnIndex  # noqa: E402
+
+IGNORE_FEATURES = ['Unnamed: 0', 'SK_ID_CURR', 'INDEX', 'TARGET']
+
+
+# Chargement des features imputées par la médiane, comme dans l'API
+def load_features(data_path):
+    df = pd.read_parquet(data_path)
+    features = df[[col for col in df.columns if col not in IGNORE_FEATURES]].to_numpy(dtype=np.float64)
+    medians = np.nanmedian(features, axis=0)
+    return np.where(np.isnan(features), medians, features)
+
+
+# Mesure du débit et du rappel d'une fonction de recherche sur les requêtes de test
+def measure(search, queries, truth, k):
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    elapsed = time.perf_counter() - start
+    recall = np.mean([len(set(found) & set(expected)) / k for found, expected in zip(results, truth)])
+    return recall, len(queries) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des plus proches voisins exacts et approximatifs")
+    parser.add_argument("--data", default="test_df.parquet")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--components", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--scaling", action="store_true")
+    args = parser.parse_args()
+
+    features = load_features(args.data)
+    rng = np.random.default_rng(0)
+    queries = features[rng.choice(len(features), size=min(args.queries, len(features)), replace=False)]
+
+    # Vérité terrain : NearestNeighbors exact sur l'espace de l'index
+    start = time.perf_counter()
+    exact = KnnIndex.build(features, scaling=args.scaling)
+    print(f"index exact construit en {time.perf_counter() - start:.2f} s "
+          f"({features.shape[0]} clients, {features.shape[1]} features)")
+    scaled = (features - exact.mean) / exact.scale
+    nn_model = NearestNeighbors(n_neighbors=args.k).fit(scaled)
+    start = time.perf_counter()
+    truth = [nn_model.kneighbors(((query - exact.mean) / exact.scale)[None, :], return_distance=False)[0]
+             for query in queries]
+    sklearn_qps = len(queries) / (time.perf_counter() - start)
+
+    print(f"{'mode':<32}{'rappel@' + str(args.k):>12}{'requêtes/s':>14}")
+    print(f"{'sklearn NearestNeighbors':<32}{1.0:>12.3f}{sklearn_qps:>14.1f}")
+    recall, qps = measure(lambda q: exact.query(q, args.k)[0], queries, truth, args.k)
+    print(f"{'exact (force brute float32)':<32}{recall:>12.3f}{qps:>14.1f}")
+
+    for n_components in args.components:
+        start = time.perf_counter()
+        approx = ApproxKnnIndex.build(exact, n_components=n_components)
+        build_time = time.perf_counter() - start
+        for n_probes in args.probes:
+            recall, qps = measure(lambda q: approx.query(q, args.k, n_probes=n_probes)[0], queries, truth, args.k)
+            label = f"approx acp={n_components} probes={n_probes}"
+            print(f"{label:<32}{recall:>12.3f}{qps:>14.1f}")
+        print(f"  (construction acp={n_components} : {build_time:.2f} s, {len(approx.centroids)} partitions)")
+
+
+if __name__ == "__main__":
+    main()
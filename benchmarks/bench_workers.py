@@ -0,0 +1,105 @@
+# Benchmark du déploiement multi-workers (gunicorn_api_conf.py) : mémoire par worker et débit
+# d'une route selon le nombre de workers
+#
+# Utilisation : python benchmarks/bench_workers.py [--workers 1 2 4] [--route /credit/369780]
+#               [--concurrency 16] [--duration 10]
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+# Mémoire d'un processus (ko) : résidente, proportionnelle (pages partagées divisées) et privée
+def process_memory(pid):
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty"):
+                memory[key] = int(value.split()[0])
+    return {"rss": memory["Rss"], "pss": memory["Pss"],
+            "private": memory["Private_Clean"] + memory["Private_Dirty"]}
+
+
+def child_pids(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+# Attente de la première réponse du serveur
+def wait_ready(port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Le serveur n'a pas démarré")
+
+
+# Requêtes en boucle sur la route depuis `concurrency` connexions persistantes pendant `duration` s
+def load(port, route, concurrency, duration):
+    counts = [0] * concurrency
+    errors = [0] * concurrency
+    deadline = time.monotonic() + duration
+
+    def run(slot):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.monotonic() < deadline:
+            connection.request("GET", route)
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                counts[slot] += 1
+            else:
+                errors[slot] += 1
+
+    threads = [threading.Thread(target=run, args=(slot,)) for slot in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration, sum(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mémoire et débit selon le nombre de workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--route", default="/credit/369780")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    print(f"{'workers':>8}{'req/s':>10}{'erreurs':>9}{'RSS/worker (Mo)':>17}"
+          f"{'PSS/worker (Mo)':>17}{'privé/worker (Mo)':>19}{'maître RSS (Mo)':>17}")
+    for n_workers in args.workers:
+        env = {**os.environ, "WEB_CONCURRENCY": str(n_workers), "PORT": str(args.port),
+               "SHAP_CACHE_BACKGROUND_FILL": "0"}
+        server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn_api_conf.py", "API:app"],
+                                  cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(args.port)
+            load(args.port, args.route, args.concurrency, 1)
+            rps, errors = load(args.port, args.route, args.concurrency, args.duration)
+            workers = [process_memory(pid) for pid in child_pids(server.pid)]
+            master = process_memory(server.pid)
+            mean = {key: sum(worker[key] for worker in workers) / len(workers) / 1024 for key in workers[0]}
+            print(f"{n_workers:>8}{rps:>10.0f}{errors:>9}{mean['rss']:>17.0f}{mean['pss']:>17.0f}"
+                  f"{mean['private']:>19.0f}{master['rss'] / 1024:>17.0f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Jeu de données synthétique de taille choisie avec le schéma de test_df.parquet : chaque colonne est
+# tirée (avec remise) parmi les valeurs de la colonne d'origine, valeurs manquantes comprises ; les
+# identifiants SK_ID_CURR sont uniques et nouveaux
+#
+# Utilisation : python benchmarks/synthetic_data.py --rows 100000 [--source test_df.parquet]
+#               [--output benchmarks/data/synthetic_100000.parquet] [--seed 0]
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Lignes générées puis écrites par groupe, pour borner la mémoire à 1M de clients
+CHUNK_ROWS = 50000
+
+
+def default_output(n_rows):
+    return ROOT / "benchmarks" / "data" / f"synthetic_{n_rows}.parquet"
+
+
+# Écriture du jeu synthétique (sauf si le fichier de sortie existe déjà avec ce nombre de lignes) ; renvoie son chemin
+def make_synthetic_data(n_rows, source=ROOT / "test_df.parquet", output=None, seed=0):
+    output = Path(output or default_output(n_rows))
+    if output.exists() and pq.read_metadata(output).num_rows == n_rows:
+        return output
+    output.parent.mkdir(parents=True, exist_ok=True)
+    df = pd.read_parquet(source)
+    rng = np.random.default_rng(seed)
+
+    # Identifiants uniques tirés au-dessus de ceux d'origine, dans un ordre quelconque
+    first_id = int(df["SK_ID_CURR"].max()) + 1
+    ids = first_id + rng.permutation(n_rows * 2)[:n_rows]
+
+    tmp_path = output.with_name(output.name + ".tmp")
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(tmp_path, schema) as writer:
+        for start in range(0, n_rows, CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, n_rows)
+            chunk = {}
+            for column in df.columns:
+                if column in ("Unnamed: 0", "INDEX"):
+                    chunk[column] = np.arange(start, stop, dtype=df[column].dtype)
+                elif column == "SK_ID_CURR":
+                    chunk[column] = ids[start:stop].astype(df[column].dtype)
+                else:
+                    chunk[column] = rng.choice(df[column].to_numpy(), size=stop - start)
+            writer.write_table(pa.Table.from_pandas(pd.DataFrame(chunk, columns=df.columns), schema=schema,
+                                                    preserve_index=False))
+    tmp_path.replace(output)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération d'un jeu de données synthétique")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--source", default=str(ROOT / "test_df.parquet"))
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(make_synthetic_data(args.rows, args.source, args.output, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# Suivi en continu de la dérive des données : histogrammes par feature de la population de référence
+# et des clients scorés, mis à jour à chaque scoring, et indicateurs de dérive calculés à la demande
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Lissage des proportions nulles dans le calcul du PSI
+PSI_EPSILON = 1e-4
+
+
+# Nombre de bornes inférieures ou égales à chaque valeur (classe de l'histogramme), ligne par ligne ;
+# les valeurs non finies tombent dans la première classe
+def bin_indices(values, cuts, chunk_size=1024):
+    indices = np.empty(values.shape, dtype=np.int64)
+    for start in range(0, len(values), chunk_size):
+        chunk = values[start:start + chunk_size, :, None]
+        indices[start:start + chunk_size] = np.count_nonzero(chunk >= cuts, axis=-1)
+    return indices
+
+
+# Indicateurs de dérive de chaque feature entre deux histogrammes (une ligne par feature) :
+# PSI, statistique de Kolmogorov-Smirnov sur les fonctions de répartition des classes et
+# distance de Jensen-Shannon (base 2, entre 0 et 1)
+def drift_metrics(reference_counts, current_counts):
+    p = reference_counts / np.maximum(reference_counts.sum(axis=1, keepdims=True), 1)
+    q = current_counts / np.maximum(current_counts.sum(axis=1, keepdims=True), 1)
+
+    p_smooth, q_smooth = np.maximum(p, PSI_EPSILON), np.maximum(q, PSI_EPSILON)
+    psi = ((q_smooth - p_smooth) * np.log(q_smooth / p_smooth)).sum(axis=1)
+
+    ks = np.abs(np.cumsum(p, axis=1) - np.cumsum(q, axis=1)).max(axis=1)
+
+    m = (p + q) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kl_p = np.where(p > 0, p * np.log2(p / m), 0.0).sum(axis=1)
+        kl_q = np.where(q > 0, q * np.log2(q / m), 0.0).sum(axis=1)
+    js = np.sqrt(np.clip((kl_p + kl_q) / 2, 0.0, 1.0))
+    return psi, ks, js
+
+
+class DriftMonitor:
+    """Compare la distribution des clients scorés à celle de la population de référence.
+
+    Les classes des histogrammes sont fixées par les quantiles de la référence (n_bins classes au
+    plus par feature, moins pour les indicateurs et les codes). Chaque scoring ajoute ses lignes aux
+    compteurs d'une tranche de bucket_seconds secondes ; les tranches plus anciennes que la plus
+    longue fenêtre sont oubliées, seul le cumul depuis le démarrage est conservé. Un rapport ne fait
+    que sommer des compteurs : son coût ne dépend pas du nombre de clients scorés.
+
+    Les compteurs sont propres au processus (un par worker).
+    """
+
+    def __init__(self, reference, feature_names, windows, n_bins=20, bucket_seconds=60, psi_threshold=0.2,
+                 version=""):
+        reference = np.asarray(reference, dtype=np.float64)
+        self.feature_names = list(feature_names)
+        self.windows = dict(windows)
+        self.n_bins = n_bins
+        self.bucket_seconds = bucket_seconds
+        self.psi_threshold = psi_threshold
+        self.version = version
+
+        # Bornes intérieures des classes (quantiles distincts), complétées par +inf
+        levels = np.linspace(0, 1, n_bins + 1)[1:-1]
+        quantiles = np.nanquantile(reference, levels, axis=0).T
+        self.cuts = np.full((len(self.feature_names), n_bins - 1), np.inf)
+        for column, feature_cuts in enumerate(quantiles):
+            feature_cuts = np.unique(feature_cuts[np.isfinite(feature_cuts)])
+            self.cuts[column, :len(feature_cuts)] = feature_cuts
+
+        self.reference_rows = len(reference)
+        self.reference_counts = self._counts(reference)
+        self.total_counts = np.zeros_like(self.reference_counts)
+        self.total_rows = 0
+        self.started = time.time()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    # Histogrammes (features x classes) d'une matrice de lignes
+    def _counts(self, X):
+        n_features = len(self.feature_names)
+        flat = bin_indices(X, self.cuts) + np.arange(n_features) * self.n_bins
+        return np.bincount(flat.ravel(), minlength=n_features * self.n_bins).reshape(n_features, self.n_bins)
+
+    # Ajout de lignes scorées (une ligne ou une matrice) aux compteurs de la tranche courante
+    def observe(self, X, now=None):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if not len(X):
+            return
+        counts = self._counts(X)
+        now = time.time() if now is None else now
+        bucket = int(now // self.bucket_seconds)
+        oldest = bucket - max(self.windows.values(), default=0) // self.bucket_seconds
+        with self._lock:
+            rows, bucket_counts = self._buckets.get(bucket, (0, 0))
+            self._buckets[bucket] = (rows + len(X), bucket_counts + counts)
+            self.total_counts += counts
+            self.total_rows += len(X)
+            for old in [old for old in self._buckets if old < oldest]:
+                del self._buckets[old]
+
+    # Compteurs des `seconds` dernières secondes (tranches entières), depuis le démarrage si None
+    def window_counts(self, seconds=None, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if seconds is None:
+                return self.total_rows, self.total_counts.copy()
+            first = int((now - seconds) // self.bucket_seconds) + 1
+            rows, counts = 0, np.zeros_like(self.reference_counts)
+            for bucket, (bucket_rows, bucket_counts) in self._buckets.items():
+                if bucket >= first:
+                    rows += bucket_rows
+                    counts += bucket_counts
+            return rows, counts
+
+    # Rapport d'une fenêtre : indicateurs par feature, triés par PSI décroissant (top_k premiers)
+    def window_report(self, seconds=None, now=None, top_k=None):
+        now = time.time() if now is None else now
+        rows, counts = self.window_counts(seconds, now)
+        start = self.started if seconds is None else max(self.started, now - seconds)
+        report = {"start": datetime.fromtimestamp(start, timezone.utc).isoformat(), "rows": rows}
+        if not rows:
+            return {**report, "drifted_features": 0, "share_drifted_features": 0.0, "features": {}}
+        psi, ks, js = drift_metrics(self.reference_counts, counts)
+        drifted = psi >= self.psi_threshold
+        order = np.argsort(-psi, kind="stable")[:top_k]
+        return {
+            **report,
+            "drifted_features": int(drifted.sum()),
+            "share_drifted_features": float(drifted.mean()),
+            "features": {self.feature_names[column]: {"psi": float(psi[column]), "ks": float(ks[column]),
+                                                      "js": float(js[column]), "drift": bool(drifted[column])}
+                         for column in order},
+        }
+
+    # Rapport complet : description de la référence et du trafic observé, indicateurs de chaque fenêtre
+    # (ou de la seule fenêtre nommée ; "all" désigne le cumul depuis le démarrage)
+    def report(self, window=None, top_k=None, now=None):
+        now = time.time() if now is None else now
+        windows = {**self.windows, "all": None}
+        if window is not None:
+            windows = {window: windows[window]}
+        return {
+            "timestamp": datetime.fromtimestamp(now, timezone.utc).isoformat(),
+            "data": {
+                "data_version": self.version,
+                "reference_rows": self.reference_rows,
+                "observed_rows": self.total_rows,
+                "features": len(self.feature_names),
+                "bins": self.n_bins,
+                "psi_threshold": self.psi_threshold,
+            },
+            "metrics": {name: self.window_report(seconds, now, top_k) for name, seconds in windows.items()},
+        }
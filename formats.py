@@ -0,0 +1,144 @@
+# Négociation du format de réponse des routes tabulaires : JSON (par défaut), Arrow IPC, msgpack
+import io
+import json
+
+import numpy as np
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+# Dépendances optionnelles : le format correspondant n'est proposé que si elles sont installées
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Encodeur JSON rapide optionnel (écriture la plus courte des flottants, comme json) ; json sinon
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+MEDIA_TYPES = {
+    JSON_MEDIA_TYPE: "json",
+    ARROW_MEDIA_TYPE: "arrow",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+MEDIA_TYPES_BY_FORMAT = {"json": JSON_MEDIA_TYPE, "arrow": ARROW_MEDIA_TYPE, "msgpack": MSGPACK_MEDIA_TYPE}
+
+
+# Choix du format à partir de l'en-tête Accept (par ordre de préférence q) ; JSON par défaut,
+# 406 si le format binaire demandé n'est pas disponible sur ce serveur
+def negotiate_format(accept):
+    ranges = []
+    for position, media_range in enumerate((accept or "").split(",")):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        ranges.append((-quality, position, media_type.lower()))
+    for quality, _, media_type in sorted(ranges):
+        fmt = MEDIA_TYPES.get(media_type)
+        if fmt is None or quality == 0:
+            continue
+        if (fmt == "arrow" and pa is None) or (fmt == "msgpack" and msgpack is None):
+            raise HTTPException(status_code=406, detail=f"Format {media_type} non disponible")
+        return fmt
+    return "json"
+
+
+# Valeurs float32 en float64 égaux à leur écriture décimale la plus courte (celle de str(np.float32)) :
+# sans cela, l'écriture en float64 fait apparaître le bruit du stockage float32 (24359.294921875 au
+# lieu de 24359.295). Pour chaque valeur, le plus petit nombre de chiffres significatifs qui redonne
+# le même float32. Les puissances de 10 sont exactes (au plus 10**22) : le quotient ou le produit
+# est alors le float64 le plus proche de l'écriture décimale
+def round_float32(values):
+    values = np.asarray(values, dtype=np.float32)
+    wide = values.astype(np.float64)
+    result = wide.copy()
+    pending = np.flatnonzero(np.isfinite(wide) & (wide != 0))
+    magnitude = np.floor(np.log10(np.abs(wide[pending])))
+    # Ordres de grandeur pour lesquels 1 à 9 chiffres n'utilisent que des puissances de 10 exactes
+    in_range = (magnitude >= -14) & (magnitude <= 22)
+    extreme, pending, magnitude = pending[~in_range], pending[in_range], magnitude[in_range]
+    for digits in range(1, 10):
+        if not len(pending):
+            break
+        decimals = digits - 1 - magnitude
+        scale = 10.0 ** np.abs(decimals)
+        pending_values = wide[pending]
+        with np.errstate(over="ignore", invalid="ignore"):
+            candidates = np.where(decimals >= 0, np.round(pending_values * scale) / scale,
+                                  np.round(pending_values / scale) * scale)
+        found = candidates.astype(np.float32) == values[pending]
+        result[pending[found]] = candidates[found]
+        pending, magnitude = pending[~found], magnitude[~found]
+    # Valeurs extrêmes (et éventuels restes) : écriture décimale de numpy
+    rest = np.concatenate([extreme, pending])
+    result[rest] = [float(str(value)) for value in values[rest]]
+    return result
+
+
+# Copie du dataframe dont les colonnes float32 sont passées en float64 arrondis (voir round_float32)
+def widen_float32(frame):
+    columns = [name for name, dtype in frame.dtypes.items() if dtype == np.float32]
+    if not columns:
+        return frame
+    frame = frame.copy(deep=False)
+    for name in columns:
+        frame[name] = round_float32(frame[name].to_numpy())
+    return frame
+
+
+# Enregistrements (une ligne = un dictionnaire) en types Python natifs, sans passer par to_dict ;
+# les valeurs manquantes deviennent None (null en JSON)
+def frame_records(frame):
+    frame = widen_float32(frame)
+    columns = frame.columns.tolist()
+    values = frame.to_numpy(dtype=object)
+    values[frame.isna().to_numpy()] = None
+    return [dict(zip(columns, row)) for row in values.tolist()]
+
+
+# Encodage JSON d'un objet en types Python natifs
+def json_bytes(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+# Sérialisation d'un dataframe (une ligne par enregistrement) dans le format négocié
+def tabular_response(frame, fmt, metadata=None):
+    if fmt == "arrow":
+        # Buffers des colonnes numériques repris sans copie ; les métadonnées pandas (index, types)
+        # sont remplacées par les seules métadonnées utiles au client
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        table = table.replace_schema_metadata({key: str(value) for key, value in (metadata or {}).items()})
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return Response(sink.getvalue(), media_type=ARROW_MEDIA_TYPE)
+    if fmt == "msgpack":
+        return Response(msgpack.packb(frame_records(frame)), media_type=MSGPACK_MEDIA_TYPE)
+    # Chemin JSON : enregistrements natifs encodés directement (orjson si disponible), sans l'encodeur
+    # générique de FastAPI ; chaque flottant est écrit sous sa forme la plus courte, à l'identique
+    return Response(json_bytes(frame_records(frame)), media_type=JSON_MEDIA_TYPE)
+
+
+# Sérialisation d'un objet (dictionnaire) hors Arrow : msgpack si négocié, JSON sinon
+def object_response(payload, fmt):
+    if fmt == "msgpack":
+        return Response(msgpack.packb(payload), media_type=MSGPACK_MEDIA_TYPE)
+    return payload
@@ -0,0 +1,54 @@
+# Configuration gunicorn du service FastAPI (API.py) en plusieurs workers uvicorn
+#
+# Lancement : gunicorn -c gunicorn_api_conf.py API:app
+#
+# Le modèle, l'explainer et les artefacts mappés (features, index kNN, cache SHAP) sont chargés une
+# seule fois dans le processus maître avant le fork : les workers partagent ces pages mémoire.
+#
+# Variables d'environnement :
+#   PORT                  port d'écoute (8000 par défaut)
+#   WEB_CONCURRENCY       nombre de workers (nombre de cœurs par défaut)
+#   API_MAX_CONNECTIONS   connexions traitées simultanément par worker avant de répondre 503
+#   API_TIMEOUT           délai (s) avant le redémarrage d'un worker bloqué
+#   API_PRELOAD           "1" (défaut) : application chargée avant le fork, "0" : chargée par chaque worker
+#   API_PREBUILD          "1" (défaut) : artefacts construits dans un processus séparé avant le chargement
+#   MODEL_THREADS         threads OpenMP du scoring par worker (cœurs / WEB_CONCURRENCY par défaut)
+#   SHAP_THREADS          threads OpenMP des calculs SHAP massifs par worker (même défaut)
+# La concurrence des calculs coûteux se règle par worker via <MODEL|SHAP|KNN|DATA>_MAX_CONCURRENCY/_MAX_QUEUE.
+import gc
+import os
+import subprocess
+import sys
+
+from uvicorn.workers import UvicornWorker
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+# Nombre de workers transmis à l'application, qui en déduit ses threads par worker
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "gunicorn_api_conf.ApiWorker"
+preload_app = os.environ.get("API_PRELOAD", "1") == "1"
+timeout = int(os.environ.get("API_TIMEOUT", 120))
+keepalive = 5
+accesslog = "-"
+
+
+class ApiWorker(UvicornWorker):
+    """Worker uvicorn dont le nombre de connexions simultanées est borné par API_MAX_CONNECTIONS."""
+
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS,
+                     "limit_concurrency": int(os.environ.get("API_MAX_CONNECTIONS", 256))}
+
+
+# Avant le chargement de l'application dans le maître : construction des artefacts manquants
+# (prétraitement, index kNN, table des scores) dans un processus à part. Le maître ne fait alors que
+# les mapper en mémoire, sans lancer les threads OpenMP de LightGBM, qui ne survivent pas au fork.
+def on_starting(server):
+    if os.environ.get("API_PREBUILD", "1") == "1":
+        subprocess.run([sys.executable, "-c", "import API"], check=True)
+
+
+# Application chargée, juste avant le fork des workers : les objets existants sont exclus du
+# ramasse-miettes, qui sinon réécrirait leurs en-têtes dans chaque worker (copie des pages partagées)
+def when_ready(server):
+    gc.freeze()
@@ -0,0 +1,127 @@
+# Rechargement à chaud du modèle et des données : nouvel état construit en tâche de fond puis
+# substitué d'un bloc à l'état servi
+import os
+import threading
+import time
+
+
+class HotReloader:
+    """Détient l'état servi (current) et le remplace par load_fn() à la demande (reload) ou quand
+    l'un des fichiers surveillés change (start_watch).
+
+    Le nouvel état est entièrement construit avant la substitution, qui est une simple affectation :
+    les requêtes en cours gardent l'état qu'elles ont lu au début et se terminent sur l'ancienne
+    version. En cas d'échec du chargement, l'état servi reste inchangé et l'erreur est conservée
+    dans status(). on_swap(ancien, nouveau) est appelé après chaque substitution.
+    """
+
+    def __init__(self, paths, load_fn, initial, on_swap=None):
+        self.paths = list(paths)
+        self.load_fn = load_fn
+        self.on_swap = on_swap
+        self.current = initial
+        self.reloads = 0
+        self.last_error = None
+        self.last_reload = None
+        self._fingerprint = self.fingerprint()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watch_thread = None
+        self._stop_event = threading.Event()
+
+    # Taille et date de modification des fichiers surveillés
+    def fingerprint(self):
+        fingerprint = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                fingerprint.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                fingerprint.append(None)
+        return fingerprint
+
+    @property
+    def in_progress(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # Lancement d'un rechargement en tâche de fond ; False si un rechargement est déjà en cours
+    def reload(self):
+        with self._lock:
+            if self.in_progress:
+                return False
+            self._thread = threading.Thread(target=self._run, name="hot-reload", daemon=True)
+            self._thread.start()
+            return True
+
+    # Attente de la fin du rechargement en cours
+    def wait(self, timeout=None):
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        fingerprint = self.fingerprint()
+        try:
+            new = self.load_fn()
+        except Exception as error:
+            self.last_error = f"{type(error).__name__}: {error}"
+            return
+        old, self.current = self.current, new
+        self._fingerprint = fingerprint
+        self.reloads += 1
+        self.last_error = None
+        self.last_reload = time.time()
+        if self.on_swap is not None:
+            self.on_swap(old, new)
+
+    # Surveillance des fichiers toutes les `interval` secondes, rechargement dès qu'ils changent
+    def start_watch(self, interval):
+        if self._watch_thread is not None:
+            return
+
+        def watch():
+            while not self._stop_event.wait(interval):
+                if self.fingerprint() != self._fingerprint and not self.in_progress:
+                    self.reload()
+
+        self._watch_thread = threading.Thread(target=watch, name="hot-reload-watch", daemon=True)
+        self._watch_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def status(self):
+        return {
+            "reloads": self.reloads,
+            "in_progress": self.in_progress,
+            "last_reload": self.last_reload,
+            "last_error": self.last_error,
+        }
+
+
+class VersionHeaderMiddleware:
+    """Middleware ASGI qui lit l'état servi à l'arrivée de chaque requête, le transmet à la route
+    (request.state.serving_state) pour toute la durée de la requête, et renvoie sa version dans
+    l'en-tête `header` de la réponse.
+    """
+
+    def __init__(self, app, reloader, version_fn, header="x-model-version"):
+        self.app = app
+        self.reloader = reloader
+        self.version_fn = version_fn
+        self.header = header.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state = self.reloader.current
+        scope.setdefault("state", {})["serving_state"] = state
+        version = self.version_fn(state).encode()
+
+        async def send_with_version(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (self.header, version)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
@@ -0,0 +1,102 @@
+# Cache HTTP des routes peu changeantes : validateurs (ETag, Last-Modified), réponses 304 et corps
+# compressés une seule fois par version
+import gzip
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi.responses import Response
+
+# Dépendance optionnelle : la compression brotli n'est proposée que si elle est installée
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Taille en dessous de laquelle un corps n'est pas compressé (gain négligeable)
+MIN_COMPRESS_SIZE = 1024
+
+
+class CachedBody:
+    """Corps d'une réponse figé pour une version des artefacts, avec son validateur (ETag faible)
+    et sa date de modification ; les variantes gzip et brotli sont calculées à la première demande.
+
+    last_modified vaut None pour un corps qui peut changer sans que les fichiers servis changent
+    (ETag complété de paramètres de version) : seul l'ETag permet alors de le revalider.
+    """
+
+    def __init__(self, body, media_type, etag, last_modified):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.last_modified = None if last_modified is None else int(last_modified)
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    # Corps compressé selon l'encodage ("gzip" ou "br")
+    def encoded(self, encoding):
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = brotli.compress(self.body) if encoding == "br" else gzip.compress(self.body, compresslevel=6)
+            with self._lock:
+                body = self._encoded.setdefault(encoding, body)
+        return body
+
+
+# ETag faible d'une représentation : identifiants de version et nom de la représentation
+def weak_etag(*parts):
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+# Encodage de compression préféré parmi ceux acceptés par le client (brotli, puis gzip), None sinon
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for coding in (accept_encoding or "").split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[name.lower()] = quality
+    for encoding in (["br"] if brotli is not None else []) + ["gzip"]:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+# Requête conditionnelle satisfaite : If-None-Match prioritaire (comparaison faible), If-Modified-Since
+# sinon (ignoré sans date de modification)
+def is_not_modified(headers, etag, last_modified):
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            return int(parsedate_to_datetime(if_modified_since).timestamp()) >= last_modified
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# Réponse d'un corps en cache : 304 sans corps si le client a déjà cette version, sinon le corps
+# (compressé si le client l'accepte et qu'il est assez gros), avec les en-têtes de cache
+def cached_response(request, cached, cache_control):
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept, Accept-Encoding",
+    }
+    if cached.last_modified is not None:
+        headers["Last-Modified"] = formatdate(cached.last_modified, usegmt=True)
+    if is_not_modified(request.headers, cached.etag, cached.last_modified):
+        return Response(status_code=304, headers=headers)
+    body = cached.body
+    encoding = choose_encoding(request.headers.get("accept-encoding")) if len(body) >= MIN_COMPRESS_SIZE else None
+    if encoding is not None:
+        body = cached.encoded(encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type=cached.media_type, headers=headers)
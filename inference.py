@@ -0,0 +1,78 @@
+# Moteur de prédiction natif : probabilités calculées directement par la bibliothèque LightGBM sur des
+# tampons numpy contigus, sans la validation de l'interface scikit-learn
+import ctypes
+import threading
+
+import numpy as np
+from lightgbm.basic import (_C_API_DTYPE_FLOAT32, _C_API_DTYPE_FLOAT64, _C_API_IS_ROW_MAJOR,
+                            _C_API_PREDICT_NORMAL, _LIB, _c_str, _safe_call)
+
+
+class NativeBoosterEngine:
+    """Probabilité de la classe 1 d'un classifieur LightGBM binaire, calculée par l'API C du booster.
+
+    Une ligne seule passe par la prédiction « rapide » de LightGBM (configuration préparée une fois,
+    tampons d'entrée et de sortie préalloués) ; un bloc de lignes est prédit en un appel, sur
+    num_threads threads, dans un tampon de sortie réutilisé. Les matrices float32 et float64
+    contiguës sont lues telles quelles, sans conversion.
+
+    Les tampons étant partagés, les appels sont sérialisés par un verrou.
+    """
+
+    def __init__(self, booster, num_threads=1):
+        self.booster = booster
+        self.num_threads = num_threads
+        self.n_features = booster.num_feature()
+        self._parameters = _c_str(f"num_threads={num_threads}")
+        self._lock = threading.Lock()
+        self._row = np.zeros(self.n_features, dtype=np.float64)
+        self._row_result = np.zeros(1, dtype=np.float64)
+        self._result = np.zeros(0, dtype=np.float64)
+        self._out_len = ctypes.c_int64(0)
+
+        # Configuration de la prédiction d'une ligne : toutes les itérations, entrée float64
+        self._fast_config = ctypes.c_void_p()
+        _safe_call(_LIB.LGBM_BoosterPredictForMatSingleRowFastInit(
+            booster._handle, ctypes.c_int(_C_API_PREDICT_NORMAL), ctypes.c_int(0), ctypes.c_int(-1),
+            ctypes.c_int(_C_API_DTYPE_FLOAT64), ctypes.c_int32(self.n_features), _c_str("num_threads=1"),
+            ctypes.byref(self._fast_config)))
+
+    def __del__(self):
+        if getattr(self, "_fast_config", None) is not None and self._fast_config.value:
+            _LIB.LGBM_FastConfigFree(self._fast_config)
+
+    # Probabilité de la classe 1 d'une seule ligne
+    def predict_row(self, row):
+        with self._lock:
+            self._row[:] = row
+            _safe_call(_LIB.LGBM_BoosterPredictForMatSingleRowFast(
+                self._fast_config, self._row.ctypes.data_as(ctypes.c_void_p), ctypes.byref(self._out_len),
+                self._row_result.ctypes.data_as(ctypes.POINTER(ctypes.c_double))))
+            return float(self._row_result[0])
+
+    # Probabilités de la classe 1 d'une matrice (une ligne par client)
+    def predict(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            return np.array([self.predict_row(X)])
+        if X.dtype not in (np.float32, np.float64) or not X.flags.c_contiguous:
+            X = np.ascontiguousarray(X, dtype=np.float64)
+        if len(X) == 1:
+            return np.array([self.predict_row(X[0])])
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"{X.shape[1]} features reçues, {self.n_features} attendues")
+        data_type = _C_API_DTYPE_FLOAT32 if X.dtype == np.float32 else _C_API_DTYPE_FLOAT64
+        with self._lock:
+            if len(self._result) < len(X):
+                self._result = np.zeros(len(X), dtype=np.float64)
+            _safe_call(_LIB.LGBM_BoosterPredictForMat(
+                self.booster._handle, X.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(data_type),
+                ctypes.c_int32(len(X)), ctypes.c_int32(self.n_features), ctypes.c_int(_C_API_IS_ROW_MAJOR),
+                ctypes.c_int(_C_API_PREDICT_NORMAL), ctypes.c_int(0), ctypes.c_int(-1), self._parameters,
+                ctypes.byref(self._out_len), self._result.ctypes.data_as(ctypes.POINTER(ctypes.c_double))))
+            return self._result[:len(X)].copy()
+
+    # Probabilités des deux classes, comme LGBMClassifier.predict_proba
+    def predict_proba(self, X):
+        proba_1 = self.predict(X)
+        return np.column_stack([1.0 - proba_1, proba_1])
@@ -0,0 +1,211 @@
+# Index des plus proches voisins construit une seule fois et persisté à côté du parquet
+import numpy as np
+
+from artifacts import artifact_path, atomic_write
+
+
+class KnnIndex:
+    """Recherche exacte (force brute) sur une matrice float32 pré-calculée.
+
+    La matrice est éventuellement standardisée (moyenne nulle, variance unitaire) pour que
+    les colonnes de grande amplitude (AMT_INCOME_TOTAL, ...) ne dominent pas la distance.
+    """
+
+    def __init__(self, matrix, mean, scale, norms, source=""):
+        self.matrix = matrix
+        self.mean = mean
+        self.scale = scale
+        self.norms = norms
+        self.source = source
+
+    # Construction de l'index à partir de la matrice des features (déjà imputée)
+    @classmethod
+    def build(cls, features, scaling=False, source=""):
+        features = np.asarray(features, dtype=np.float64)
+        n_features = features.shape[1]
+        if scaling:
+            mean = features.mean(axis=0)
+            scale = features.std(axis=0)
+            scale[scale == 0] = 1.0
+        else:
+            mean = np.zeros(n_features)
+            scale = np.ones(n_features)
+        matrix = np.ascontiguousarray((features - mean) / scale, dtype=np.float32)
+        norms = np.einsum("ij,ij->i", matrix, matrix, dtype=np.float64)
+        return cls(matrix, mean, scale, norms, source)
+
+    # Sauvegarde : matrice en .npy (mappable en mémoire), paramètres en .npz
+    def save(self, data_path):
+        atomic_write(artifact_path(data_path, "knn.npy"), lambda f: np.save(f, self.matrix))
+        atomic_write(artifact_path(data_path, "knn.npz"), lambda f: np.savez(
+            f, mean=self.mean, scale=self.scale, norms=self.norms, source=np.array(self.source)))
+
+    # Chargement avec la matrice mappée en mémoire (pages partagées entre workers)
+    @classmethod
+    def load(cls, data_path):
+        with np.load(artifact_path(data_path, "knn.npz")) as params:
+            mean, scale, norms = params["mean"], params["scale"], params["norms"]
+            source = str(params["source"])
+        matrix = np.load(artifact_path(data_path, "knn.npy"), mmap_mode="r")
+        return cls(matrix, mean, scale, norms, source)
+
+    # Chargement de l'index persisté s'il correspond aux données, reconstruction sinon
+    @classmethod
+    def load_or_build(cls, data_path, features, source, scaling=False):
+        source = f"{source}:{'standard' if scaling else 'none'}"
+        try:
+            index = cls.load(data_path)
+            if index.source == source and index.matrix.shape == features.shape:
+                return index
+        except (OSError, KeyError, ValueError):
+            pass
+        index = cls.build(features, scaling=scaling, source=source)
+        index.save(data_path)
+        return index
+
+    # Projection d'un vecteur de features dans l'espace de l'index
+    def transform(self, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float64))
+        return ((vectors - self.mean) / self.scale).astype(np.float32)
+
+    # Recherche des n_neighbors plus proches voisins : (positions, distances) triées
+    def query(self, vector, n_neighbors=10):
+        query = self.transform(vector)[0]
+        n_neighbors = min(n_neighbors, self.matrix.shape[0])
+        distances = self.norms - 2.0 * (self.matrix @ query) + float(query @ query)
+        candidates = np.argpartition(distances, n_neighbors - 1)[:n_neighbors]
+        order = candidates[np.argsort(distances[candidates], kind="stable")]
+        return order, np.sqrt(np.maximum(distances[order], 0.0))
+
+
+class ApproxKnnIndex:
+    """Recherche approximative : projection ACP puis index partitionné (IVF, k-means).
+
+    Seules les partitions les plus proches de la requête (n_probes) sont parcourues dans
+    l'espace réduit ; les meilleurs candidats sont ensuite reclassés avec la distance exacte
+    de l'index complet, ce qui garde un bon rappel pour un coût de recherche sous-linéaire.
+    """
+
+    def __init__(self, base, pca_mean, components, centroids, reduced, list_offsets,
+                 list_positions, n_probes=8, refine=4, source=""):
+        self.base = base
+        self.pca_mean = pca_mean
+        self.components = components
+        self.centroids = centroids
+        self.centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        self.reduced = reduced
+        self.list_offsets = list_offsets
+        self.list_positions = list_positions
+        self.n_probes = n_probes
+        self.refine = refine
+        self.source = source
+
+    # Construction : ACP sur la matrice de l'index complet puis k-means sur l'espace réduit
+    @classmethod
+    def build(cls, base, n_components=32, n_lists=None, n_probes=8, refine=4,
+              n_iter=10, sample_size=50000, seed=0, source=""):
+        rng = np.random.default_rng(seed)
+        n_rows, n_features = base.matrix.shape
+        n_components = min(n_components, n_features, n_rows)
+        n_lists = n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+
+        # Axes principaux estimés sur un échantillon pour borner le coût de la SVD
+        sample = base.matrix[rng.choice(n_rows, size=min(sample_size, n_rows), replace=False)]
+        sample = np.asarray(sample, dtype=np.float64)
+        pca_mean = sample.mean(axis=0).astype(np.float32)
+        _, _, vt = np.linalg.svd(sample - sample.mean(axis=0), full_matrices=False)
+        components = np.ascontiguousarray(vt[:n_components], dtype=np.float32)
+        reduced = cls._project(base.matrix, pca_mean, components)
+
+        # k-means (Lloyd) sur l'échantillon réduit, puis affectation de toutes les lignes
+        sample_reduced = reduced[rng.choice(n_rows, size=min(sample_size, n_rows), replace=False)]
+        centroids = sample_reduced[rng.choice(len(sample_reduced), size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = cls._nearest_centroid(sample_reduced, centroids)
+            counts = np.bincount(labels, minlength=n_lists)
+            sums = np.zeros_like(centroids, dtype=np.float64)
+            np.add.at(sums, labels, sample_reduced)
+            filled = counts > 0
+            centroids[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+        labels = cls._nearest_centroid(reduced, centroids)
+
+        # Listes inversées : positions triées par partition et bornes de chaque partition
+        list_positions = np.argsort(labels, kind="stable")
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=n_lists))])
+        return cls(base, pca_mean, components, centroids, reduced, list_offsets,
+                   list_positions, n_probes=n_probes, refine=refine, source=source)
+
+    @staticmethod
+    def _project(matrix, pca_mean, components, chunk_size=65536):
+        reduced = np.empty((matrix.shape[0], components.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], chunk_size):
+            chunk = np.asarray(matrix[start:start + chunk_size], dtype=np.float32)
+            reduced[start:start + chunk_size] = (chunk - pca_mean) @ components.T
+        return reduced
+
+    @staticmethod
+    def _nearest_centroid(points, centroids, chunk_size=65536):
+        centroid_norms = np.einsum("ij,ij->i", centroids, centroids)
+        labels = np.empty(points.shape[0], dtype=np.int64)
+        for start in range(0, points.shape[0], chunk_size):
+            chunk = points[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmin(centroid_norms - 2.0 * chunk @ centroids.T, axis=1)
+        return labels
+
+    # Sauvegarde des paramètres de l'index partitionné en .npz
+    def save(self, data_path):
+        atomic_write(artifact_path(data_path, "ivf.npz"), lambda f: np.savez(
+            f, pca_mean=self.pca_mean, components=self.components, centroids=self.centroids,
+            reduced=self.reduced, list_offsets=self.list_offsets, list_positions=self.list_positions,
+            source=np.array(self.source)))
+
+    @classmethod
+    def load(cls, data_path, base, n_probes=8, refine=4):
+        with np.load(artifact_path(data_path, "ivf.npz")) as params:
+            return cls(base, params["pca_mean"], params["components"], params["centroids"],
+                       params["reduced"], params["list_offsets"], params["list_positions"],
+                       n_probes=n_probes, refine=refine, source=str(params["source"]))
+
+    # Chargement de l'index persisté s'il a été construit sur le même index complet
+    @classmethod
+    def load_or_build(cls, data_path, base, n_components=32, n_lists=None, n_probes=8, refine=4):
+        source = f"{base.source}:{n_components}:{n_lists}"
+        try:
+            index = cls.load(data_path, base, n_probes=n_probes, refine=refine)
+            if index.source == source and index.reduced.shape[0] == base.matrix.shape[0]:
+                return index
+        except (OSError, KeyError, ValueError):
+            pass
+        index = cls.build(base, n_components=n_components, n_lists=n_lists,
+                          n_probes=n_probes, refine=refine, source=source)
+        index.save(data_path)
+        return index
+
+    # Recherche approximative des n_neighbors plus proches voisins : (positions, distances)
+    def query(self, vector, n_neighbors=10, n_probes=None):
+        n_probes = min(n_probes or self.n_probes, len(self.centroids))
+        query = self.base.transform(vector)[0]
+        reduced_query = (query - self.pca_mean) @ self.components.T
+
+        # Sélection des partitions les plus proches de la requête
+        centroid_distances = self.centroid_norms - 2.0 * (self.centroids @ reduced_query)
+        probes = np.argpartition(centroid_distances, n_probes - 1)[:n_probes]
+        candidates = np.concatenate([
+            self.list_positions[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes
+        ])
+        if len(candidates) < n_neighbors:
+            return self.base.query(vector, n_neighbors)
+
+        # Présélection dans l'espace réduit
+        n_keep = min(len(candidates), n_neighbors * self.refine)
+        diff = self.reduced[candidates] - reduced_query
+        reduced_distances = np.einsum("ij,ij->i", diff, diff)
+        candidates = candidates[np.argpartition(reduced_distances, n_keep - 1)[:n_keep]]
+
+        # Reclassement des candidats avec la distance exacte
+        distances = (self.base.norms[candidates] - 2.0 * (self.base.matrix[candidates] @ query)
+                     + float(query @ query))
+        best = np.argpartition(distances, n_neighbors - 1)[:n_neighbors]
+        best = best[np.argsort(distances[best], kind="stable")]
+        return candidates[best], np.sqrt(np.maximum(distances[best], 0.0))
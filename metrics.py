@@ -0,0 +1,146 @@
+# Mesures de l'API au format texte de Prometheus : compteurs, histogrammes de latence par route et
+# par étape des routes (spans), jauges lues au moment de la collecte
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes (s) des histogrammes de latence
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Étapes mesurées de la requête en cours (liste de (étape, durée)), None hors d'une requête
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Compteurs, jauges et histogrammes identifiés par un nom et des étiquettes ((clé, valeur), ...).
+
+    Les collecteurs enregistrés par add_collector sont appelés à chaque rendu et renvoient des
+    échantillons (nom, étiquettes, valeur) de métriques décrites par describe : ils servent aux
+    valeurs déjà tenues ailleurs (caches, pools, mémoire du processus).
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._descriptions = {}
+        self._values = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, help_text):
+        self._descriptions[name] = (kind, help_text)
+
+    # Ajout à un compteur ou à une jauge
+    def add(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    # Ajout d'une observation à un histogramme
+    def observe(self, name, labels, value):
+        key = (name, tuple(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = histogram[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            histogram[1] += value
+            histogram[2] += 1
+
+    def add_collector(self, collect_fn):
+        self._collectors.append(collect_fn)
+
+    # Exposition au format texte de Prometheus (version 0.0.4)
+    def render(self):
+        samples = {}
+        with self._lock:
+            for (name, labels), value in self._values.items():
+                samples.setdefault(name, []).append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), (counts, total, count) in self._histograms.items():
+                lines = samples.setdefault(name, [])
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{format_labels((*labels, ('le', bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{format_labels((*labels, ('le', '+Inf')))} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for collect_fn in self._collectors:
+            for name, labels, value in collect_fn():
+                samples.setdefault(name, []).append(f"{name}{format_labels(labels)} {value}")
+
+        output = []
+        for name, lines in samples.items():
+            kind, help_text = self._descriptions.get(name, ("untyped", ""))
+            output += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *lines]
+        return "\n".join(output) + "\n"
+
+
+# Mesure d'une étape de la requête en cours, rapportée à sa route par TimingMiddleware
+@contextmanager
+def span(stage):
+    stages = _request_stages.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stages is not None:
+            stages.append((stage, time.perf_counter() - start))
+
+
+class TimingMiddleware:
+    """Middleware ASGI qui compte les requêtes (route, méthode, statut), mesure leur durée et celle
+    des étapes signalées par span() dans les routes, et tient le nombre de requêtes en cours.
+
+    La route est le chemin déclaré (« /credit/{id_client} ») et non le chemin reçu, pour borner le
+    nombre de séries.
+    """
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+        registry.describe("api_requests_total", "counter", "Requêtes traitées par route, méthode et statut")
+        registry.describe("api_request_duration_seconds", "histogram", "Durée des requêtes par route")
+        registry.describe("api_stage_duration_seconds", "histogram", "Durée des étapes des routes")
+        registry.describe("api_requests_in_flight", "gauge", "Requêtes en cours de traitement")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stages = []
+        token = _request_stages.set(stages)
+        status = 500
+        start = time.perf_counter()
+        self.registry.add("api_requests_in_flight", (), 1)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stages.reset(token)
+            self.registry.add("api_requests_in_flight", (), -1)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            self.registry.add("api_requests_total", (("route", route), ("method", method), ("status", status)))
+            self.registry.observe("api_request_duration_seconds", (("route", route), ("method", method)), elapsed)
+            for stage, duration in stages:
+                self.registry.observe("api_stage_duration_seconds", (("route", route), ("stage", stage)), duration)
@@ -0,0 +1,381 @@
+# Données servies pré-traitées hors ligne (imputation, ordre des colonnes, index des identifiants)
+# et rechargées par mappage mémoire au démarrage de l'API
+#
+# Construction (à relancer quand test_df.parquet change) : python preprocessing.py [--data test_df.parquet]
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from artifacts import artifact_path, atomic_write, file_hash
+
+# Colonnes qui ne sont pas des features du modèle (identifiants, index, cible)
+IGNORE_FEATURES = ['Unnamed: 0', 'SK_ID_CURR', 'INDEX', 'TARGET']
+
+# Codes catégoriels servis comme tels (catégories pandas / dictionnaires Arrow) aux clients de l'API
+CATEGORICAL_CODES = ['CODE_GENDER']
+
+# Nombre maximal de valeurs distinctes d'une feature entière stockée comme code sur un octet
+MAX_CODE_LEVELS = 32
+
+# Version du format des artefacts, incluse dans leur empreinte pour invalider les anciens fichiers
+FORMAT_VERSION = 2
+
+
+# Type de stockage d'une feature (après imputation) : "flag" (0/1), "code" (entiers peu nombreux,
+# ou code catégoriel déclaré) stockés sur un octet, "continuous" en float32 sinon
+def column_kind(name, values):
+    levels = np.unique(values)
+    if name in CATEGORICAL_CODES or (len(levels) <= MAX_CODE_LEVELS and np.all(levels == np.round(levels))
+                                     and levels.min() >= -128 and levels.max() <= 127):
+        if name not in CATEGORICAL_CODES and set(levels.tolist()) <= {0.0, 1.0}:
+            return "flag"
+        return "code"
+    return "continuous"
+
+
+class CompactMatrix:
+    """Matrice clients x features stockée par blocs compacts : les features continues en float32,
+    les indicateurs 0/1 et codes entiers en int8. Se lit comme une matrice float32 dense
+    (matrix[i], matrix[i:j], matrix[positions], matrix[:, j], matrix[i, colonnes]) : seules les
+    lignes ou la colonne demandées sont reconstituées.
+    """
+
+    dtype = np.dtype(np.float32)
+
+    def __init__(self, continuous, codes, kinds):
+        self.continuous = continuous
+        self.codes = codes
+        self.kinds = kinds
+        # Emplacement de chaque feature : bloc (0 = continu, 1 = codes) et colonne dans ce bloc
+        is_code = np.array([kind != "continuous" for kind in kinds], dtype=bool)
+        self._code_columns = np.flatnonzero(is_code)
+        self._continuous_columns = np.flatnonzero(~is_code)
+        self._location = np.empty((len(kinds), 2), dtype=np.int64)
+        self._location[self._continuous_columns] = np.c_[np.zeros(len(self._continuous_columns)),
+                                                          np.arange(len(self._continuous_columns))]
+        self._location[self._code_columns] = np.c_[np.ones(len(self._code_columns)),
+                                                    np.arange(len(self._code_columns))]
+
+    # Découpage d'une matrice dense float selon les types de stockage
+    @classmethod
+    def from_dense(cls, values, kinds):
+        is_code = np.array([kind != "continuous" for kind in kinds], dtype=bool)
+        continuous = np.ascontiguousarray(values[:, ~is_code], dtype=np.float32)
+        codes = np.ascontiguousarray(values[:, is_code], dtype=np.int8)
+        return cls(continuous, codes, kinds)
+
+    @property
+    def shape(self):
+        return (len(self.continuous), len(self.kinds))
+
+    @property
+    def nbytes(self):
+        return self.continuous.nbytes + self.codes.nbytes
+
+    def __len__(self):
+        return len(self.continuous)
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self._rows(slice(None))
+        return dense if dtype is None else dense.astype(dtype, copy=False)
+
+    # Lignes reconstituées en float32 dense
+    def _rows(self, rows):
+        continuous, codes = self.continuous[rows], self.codes[rows]
+        dense = np.empty(continuous.shape[:-1] + (len(self.kinds),), dtype=np.float32)
+        dense[..., self._continuous_columns] = continuous
+        dense[..., self._code_columns] = codes
+        return dense
+
+    # Bloc (0 = continu, 1 = codes) et colonne dans ce bloc d'une feature
+    def location(self, column):
+        block, index = self._location[column]
+        return int(block), int(index)
+
+    def __getitem__(self, key):
+        rows, columns = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(rows, list):
+            rows = np.asarray(rows, dtype=np.int64)
+        if isinstance(columns, (int, np.integer)):
+            block, index = self.location(columns)
+            values = (self.codes if block else self.continuous)[rows, index]
+            return np.asarray(values, dtype=np.float32)
+        return self._rows(rows)[..., columns]
+
+
+class FeatureTransform:
+    """Transformation des lignes brutes (dictionnaires feature -> valeur) en matrice du modèle :
+    colonnes dans l'ordre de feature_names, valeurs absentes, nulles ou non finies remplacées par les
+    médianes stockées avec les données pré-traitées (mêmes valeurs d'un démarrage à l'autre).
+
+    Les index de colonnes sont calculés une fois ; une transformation ne fait qu'une affectation
+    numpy groupée, sans dataframe intermédiaire.
+    """
+
+    def __init__(self, feature_names, medians):
+        self.feature_names = list(feature_names)
+        self.columns = {name: column for column, name in enumerate(self.feature_names)}
+        self.medians = np.asarray(medians, dtype=np.float64)
+
+    # Noms de features inconnus du modèle dans les lignes reçues (triés)
+    def unknown_features(self, rows):
+        return sorted({name for row in rows for name in row} - self.columns.keys())
+
+    # Matrice float64 (une ligne par ligne reçue) prête pour le modèle
+    def transform(self, rows):
+        X = np.tile(self.medians, (len(rows), 1))
+        columns = self.columns
+        cells = [(i, columns[name], value) for i, row in enumerate(rows)
+                 for name, value in row.items() if value is not None]
+        if cells:
+            row_indices, column_indices, values = zip(*cells)
+            X[row_indices, column_indices] = values
+            invalid = ~np.isfinite(X)
+            if invalid.any():
+                X[invalid] = np.take(self.medians, np.nonzero(invalid)[1])
+        return X
+
+
+class PreprocessedData:
+    """Population servie sous forme de tableaux numpy prêts à l'emploi :
+
+    - test_df.features.npy et test_df.codes.npy : matrice clients x features (valeurs manquantes
+      remplacées par la médiane de la colonne) en deux blocs compacts, features continues en
+      float32 et indicateurs / codes en int8 (voir CompactMatrix), mappés en mémoire ;
+    - test_df.ids.npy : index des identifiants, SK_ID_CURR triés et positions des lignes
+      correspondantes (mappé en mémoire, recherche par dichotomie) ;
+    - test_df.dataset.npz : médianes et types de stockage des features, noms et ordre des colonnes,
+      colonnes annexes (identifiants, index) et empreinte du parquet source.
+
+    Les fichiers mappés sont en lecture seule : les workers d'un même serveur partagent les mêmes
+    pages via le cache du système, et le démarrage ne lit ni ne traite le parquet.
+    """
+
+    def __init__(self, features, medians, id_index, columns, feature_names, extras, source=""):
+        self.features = features
+        self.categories = {name: np.unique(features.codes[:, features.location(column)[1]]).tolist()
+                           for column, name in enumerate(feature_names) if name in CATEGORICAL_CODES}
+        self.medians = medians
+        self.id_index = id_index
+        self.columns = columns
+        self.feature_names = feature_names
+        self.extras = extras
+        self.source = source
+        self.feature_columns = {name: column for column, name in enumerate(feature_names)}
+        self.transform = FeatureTransform(feature_names, medians)
+        self._frame_plans = {}
+
+    def __len__(self):
+        return len(self.features)
+
+    # Identifiants clients dans l'ordre des lignes
+    @property
+    def ids(self):
+        return self.extras['SK_ID_CURR']
+
+    # Pré-traitement du dataframe brut : médianes, imputation, conversion en float32
+    @classmethod
+    def build(cls, df, source=""):
+        columns = df.columns.tolist()
+        feature_names = [col for col in columns if col not in IGNORE_FEATURES]
+
+        # Médiane de chaque feature (valeurs manquantes ignorées), qui sert aussi à l'imputation
+        values = df[feature_names].to_numpy(dtype=np.float64, copy=True)
+        medians = np.nanmedian(values, axis=0) if len(values) else np.zeros(len(feature_names))
+        missing = np.isnan(values)
+        values[missing] = np.take(medians, np.nonzero(missing)[1])
+        kinds = [column_kind(name, values[:, column]) for column, name in enumerate(feature_names)]
+        features = CompactMatrix.from_dense(values, kinds)
+
+        # Colonnes annexes conservées telles quelles (imputées par la médiane si besoin)
+        extras = {}
+        for name in columns:
+            if name in feature_names:
+                continue
+            column = df[name].to_numpy()
+            if column.dtype.kind == 'f' and np.isnan(column).any():
+                column = np.where(np.isnan(column), np.nanmedian(column), column)
+            extras[name] = column
+
+        # Index des identifiants : tri stable, la première occurrence d'un identifiant l'emporte
+        ids = np.asarray(extras['SK_ID_CURR'], dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        id_index = np.stack([ids[order], order.astype(np.int64)])
+        return cls(features, medians, id_index, columns, feature_names, extras, source)
+
+    def save(self, data_path):
+        atomic_write(artifact_path(data_path, "features.npy"), lambda f: np.save(f, self.features.continuous))
+        atomic_write(artifact_path(data_path, "codes.npy"), lambda f: np.save(f, self.features.codes))
+        atomic_write(artifact_path(data_path, "ids.npy"), lambda f: np.save(f, self.id_index))
+        meta = {"columns": self.columns, "feature_names": self.feature_names, "kinds": self.features.kinds,
+                "extras": list(self.extras), "source": self.source}
+        atomic_write(artifact_path(data_path, "dataset.npz"), lambda f: np.savez(
+            f, medians=self.medians, meta=np.array(json.dumps(meta)),
+            **{f"extra_{i}": column for i, column in enumerate(self.extras.values())}))
+
+    # Chargement avec la matrice des features et l'index des identifiants mappés en mémoire
+    @classmethod
+    def load(cls, data_path):
+        with np.load(artifact_path(data_path, "dataset.npz")) as stored:
+            meta = json.loads(str(stored["meta"]))
+            medians = stored["medians"]
+            extras = {name: stored[f"extra_{i}"] for i, name in enumerate(meta["extras"])}
+        features = CompactMatrix(np.load(artifact_path(data_path, "features.npy"), mmap_mode="r"),
+                                 np.load(artifact_path(data_path, "codes.npy"), mmap_mode="r"), meta["kinds"])
+        id_index = np.load(artifact_path(data_path, "ids.npy"), mmap_mode="r")
+        return cls(features, medians, id_index, meta["columns"], meta["feature_names"], extras, meta["source"])
+
+    # Empreinte des artefacts : contenu du parquet et version du format
+    @staticmethod
+    def source_of(data_path):
+        return f"{file_hash(data_path)}:v{FORMAT_VERSION}"
+
+    # Chargement des artefacts s'ils correspondent au parquet, pré-traitement (puis sauvegarde) sinon.
+    # Le parquet n'est relu entièrement que s'il a été modifié depuis la construction des artefacts.
+    @classmethod
+    def load_or_build(cls, data_path):
+        stamp_path = artifact_path(data_path, "dataset.stamp")
+        stat = os.stat(data_path)
+        stamp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        try:
+            with open(stamp_path) as f:
+                stored_stamp = json.load(f)
+        except (OSError, ValueError):
+            stored_stamp = {}
+        source = stored_stamp.get("source") if stored_stamp.items() >= stamp.items() else None
+        if source is None:
+            source = cls.source_of(data_path)
+        try:
+            data = cls.load(data_path)
+            if data.source != source:
+                data = None
+        except (OSError, KeyError, ValueError):
+            data = None
+        if data is None:
+            data = cls.build(pd.read_parquet(data_path), source=source)
+            data.save(data_path)
+        if stored_stamp != {**stamp, "source": source}:
+            atomic_write(stamp_path, lambda f: f.write(json.dumps({**stamp, "source": source}).encode()))
+        return data
+
+    # Positions des lignes de plusieurs clients (première occurrence), -1 pour les absents
+    def positions(self, client_ids):
+        try:
+            client_ids = np.asarray(client_ids, dtype=np.int64)
+        except OverflowError:
+            # Identifiants hors de l'intervalle int64 : absents des données
+            bounds = np.iinfo(np.int64)
+            in_range = np.array([bounds.min <= int(client_id) <= bounds.max for client_id in client_ids])
+            positions = np.full(len(in_range), -1, dtype=np.int64)
+            positions[in_range] = self.positions([client_id for client_id, ok in zip(client_ids, in_range) if ok])
+            return positions
+        sorted_ids, rows = self.id_index
+        found = np.minimum(np.searchsorted(sorted_ids, client_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[found] == client_ids, rows[found], -1)
+
+    # Position de la ligne d'un client, None s'il est absent
+    def position(self, client_id):
+        position = int(self.positions([client_id])[0])
+        return None if position < 0 else position
+
+    # Page d'identifiants triés strictement supérieurs au curseur (dernier identifiant de la page
+    # précédente, None pour la première page) ; l'identifiant suivant est None en fin de liste
+    def ids_after(self, cursor, limit):
+        sorted_ids = self.id_index[0]
+        start = 0 if cursor is None else int(np.searchsorted(sorted_ids, cursor, side="right"))
+        page = sorted_ids[start:start + limit].tolist()
+        next_cursor = page[-1] if page and start + limit < len(sorted_ids) else None
+        return page, next_cursor
+
+    # Identifiants (croissants) dont l'écriture décimale commence par `prefix` : pour chaque nombre de
+    # chiffres supplémentaires k, l'intervalle [prefix·10^k, (prefix+1)·10^k) est cherché par dichotomie
+    # dans les identifiants triés ; les intervalles sont disjoints et croissants avec k
+    def ids_with_prefix(self, prefix, limit):
+        sorted_ids = self.id_index[0]
+        if not len(sorted_ids) or not prefix.isdigit():
+            return []
+        max_digits = len(str(int(sorted_ids[-1])))
+        value = int(prefix)
+        # Un préfixe commençant par 0 ne correspond qu'à l'identifiant 0
+        extra_digits = range(max_digits - len(prefix) + 1) if prefix[0] != "0" else range(len(prefix) == 1)
+        matches = []
+        for k in extra_digits:
+            low, high = np.searchsorted(sorted_ids, [value * 10 ** k, (value + 1) * 10 ** k])
+            matches.extend(sorted_ids[low:min(high, low + limit - len(matches))].tolist())
+            if len(matches) >= limit:
+                break
+        return matches
+
+    # Dataframe des lignes demandées (toutes les colonnes, ou celles nommées, dans l'ordre donné), avec
+    # les types compacts : float32, int8 pour les indicateurs et codes, catégories pour CATEGORICAL_CODES ;
+    # seules les lignes sélectionnées sont lues dans les blocs mappés
+    def frame(self, positions, columns=None):
+        positions = np.asarray(positions, dtype=np.int64)
+        names, indices, order = self._frame_plan(tuple(self.columns if columns is None else columns))
+
+        # Un dataframe par bloc (un seul bloc pandas chacun), puis remise dans l'ordre demandé
+        parts = [pd.DataFrame(matrix[np.ix_(positions, block_indices)], columns=block_names)
+                 for matrix, block_names, block_indices in zip((self.features.continuous, self.features.codes),
+                                                               names, indices) if len(block_names)]
+        if len(names[2]):
+            parts.append(pd.DataFrame({name: self.extras[name][positions] for name in names[2]}))
+        frame = pd.concat(parts, axis=1) if len(parts) > 1 else parts[0]
+        frame = frame.iloc[:, order]
+        for name, categories in self.categories.items():
+            if name in frame:
+                codes = np.searchsorted(categories, frame[name].to_numpy())
+                frame[name] = pd.Categorical.from_codes(codes, categories=categories)
+        return frame
+
+    # Répartition des colonnes demandées entre les blocs (continu, codes) et les colonnes annexes,
+    # et ordre de remise en place ; mémorisée par liste de colonnes
+    def _frame_plan(self, columns):
+        plan = self._frame_plans.get(columns)
+        if plan is None:
+            names, indices = ([], [], []), ([], [])
+            for name in columns:
+                column = self.feature_columns.get(name)
+                if column is None:
+                    names[2].append(name)
+                    continue
+                block, index = self.features.location(column)
+                names[block].append(name)
+                indices[block].append(index)
+            positions = {name: i for i, name in enumerate(names[0] + names[1] + names[2])}
+            plan = [pd.Index(block_names) for block_names in names], indices, [positions[name] for name in columns]
+            if len(self._frame_plans) < 256:
+                self._frame_plans[columns] = plan
+        return plan
+
+    # Empreinte mémoire des données servies, comparée à un dataframe float64 de toutes les colonnes
+    def memory_report(self):
+        extras = sum(column.nbytes for column in self.extras.values())
+        compact = self.features.nbytes + self.id_index.nbytes + self.medians.nbytes + extras
+        dense = len(self) * len(self.columns) * np.dtype(np.float64).itemsize
+        kinds = self.features.kinds
+        return {
+            "rows": len(self),
+            "continuous_features": kinds.count("continuous"),
+            "flag_features": kinds.count("flag"),
+            "code_features": kinds.count("code"),
+            "compact_bytes": int(compact),
+            "float64_bytes": int(dense),
+            "reduction": round(dense / max(compact, 1), 2),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Pré-traitement des données servies par l'API")
+    parser.add_argument("--data", default="test_df.parquet")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    data = PreprocessedData.load_or_build(args.data)
+    print(f"{len(data)} clients x {len(data.feature_names)} features prêts en {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
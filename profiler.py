@@ -0,0 +1,44 @@
+# Profilage par échantillonnage des piles de tous les threads du processus, au format « collapsed »
+# (une pile par ligne, cadres séparés par « ; », suivie du nombre d'échantillons), lisible par
+# flamegraph.pl, speedscope ou inferno
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Relève toutes les `interval` secondes la pile de chaque thread (sauf le sien) pendant
+    `seconds` secondes. Un seul profilage à la fois : sample() renvoie None si un autre est en cours.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def sample(self, seconds, interval=0.005):
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            stacks = Counter()
+            own_id = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    labels = []
+                    while frame is not None:
+                        labels.append(frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(thread_id, str(thread_id)))
+                    stacks[";".join(reversed(labels))] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
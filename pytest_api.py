@@ -1,3 +1,5 @@
+import json
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 from API import app  
@@ -16,6 +18,50 @@ def test_get_client_ids():
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
+# Test de la pagination par curseur : pages croissantes, sans doublon ni oubli
+def test_get_client_ids_page():
+    all_ids = sorted(client.get("/client_ids").json())
+    ids, cursor = [], None
+    for _ in range(3):
+        response = client.get("/client_ids/page", params={"limit": 50, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.json()
+        ids += page["ids"]
+        cursor = page["next_cursor"]
+    assert ids == all_ids[:150]
+    assert cursor == all_ids[149]
+    last_page = client.get("/client_ids/page", params={"cursor": all_ids[-2], "limit": 50}).json()
+    assert last_page == {"ids": [all_ids[-1]], "next_cursor": None}
+    assert client.get("/client_ids/page", params={"limit": 0}).status_code == 422
+
+# Test de la recherche par préfixe : mêmes identifiants que le filtrage de la liste complète
+def test_search_client_ids():
+    all_ids = sorted(client.get("/client_ids").json())
+    for prefix in ["1", "36", str(all_ids[0]), "0", "9999999"]:
+        response = client.get("/client_ids/search", params={"prefix": prefix, "limit": 1000})
+        assert response.status_code == 200
+        expected = [client_id for client_id in all_ids if str(client_id).startswith(prefix)][:1000]
+        assert response.json()["ids"] == expected
+    assert len(client.get("/client_ids/search", params={"prefix": "1", "limit": 5}).json()["ids"]) == 5
+    assert client.get("/client_ids/search", params={"prefix": "abc"}).status_code == 422
+
+# Test du cache HTTP des routes peu changeantes : validateurs, 304 et compression
+def test_cached_routes_conditional_requests():
+    for route in ["/client_ids", "/features", "/shap"]:
+        response = client.get(route, headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["ETag"] and "Cache-Control" in response.headers
+        not_modified = client.get(route, headers={"If-None-Match": response.headers["ETag"]})
+        assert not_modified.status_code == 304 and not_modified.content == b""
+    response = client.get("/client_ids", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert isinstance(response.json(), list)
+    response = client.get("/client_ids", headers={"If-Modified-Since": response.headers["Last-Modified"]})
+    assert response.status_code == 304
+    # Classement /shap versionné par la taille d'échantillon : revalidé par l'ETag seulement
+    response = client.get("/shap", headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200 and "Last-Modified" not in response.headers
+
 # Test de la route pour obtenir la liste des features
 def test_get_features():
     response = client.get("/features")
@@ -31,6 +77,298 @@ def test_predict_credit():
     assert "Probabilité" in response.json()
     assert "Conclusion" in response.json()
 
+# Test de la route de prédiction de crédit pour un client inconnu
+def test_predict_credit_unknown_client():
+    response = client.get("/credit/1")
+    assert response.status_code == 404
+
+# Test de la concordance de la table des scores avec le modèle
+def test_score_table_matches_model():
+    from API import reloader
+    state = reloader.current
+    proba = state.load_clf.predict_proba(state.features_matrix[:100])
+    assert np.allclose(state.score_table.probas[:100], proba[:, 0], atol=1e-6)
+    assert (state.score_table.predictions[:100] == state.load_clf.predict(state.features_matrix[:100])).all()
+
+# Test du pré-traitement hors ligne : imputation par la médiane, index des identifiants, rechargement mappé
+def test_preprocessed_data_round_trip(tmp_path):
+    import pandas as pd
+    from preprocessing import PreprocessedData
+    df = pd.DataFrame({'SK_ID_CURR': [30, 10, 20, 10], 'A': [1.0, np.nan, 3.0, 5.0], 'B': [2.0, 4.0, 6.0, 8.0]})
+    data_path = tmp_path / "data.parquet"
+    df.to_parquet(data_path)
+    built = PreprocessedData.load_or_build(data_path)
+    loaded = PreprocessedData.load_or_build(data_path)
+    assert isinstance(loaded.features.continuous, np.memmap) and loaded.features.dtype == np.float32
+    assert loaded.source == built.source
+    assert loaded.feature_names == ['A', 'B']
+    assert np.allclose(loaded.medians, [3.0, 5.0])
+    assert np.allclose(loaded.features[:, 0], [1.0, 3.0, 3.0, 5.0])
+    assert loaded.positions([10, 20, 30, 99]).tolist() == [1, 2, 0, -1]
+    assert loaded.frame([1, 0], ['B', 'SK_ID_CURR']).to_dict(orient="list") == {'B': [4.0, 2.0], 'SK_ID_CURR': [10, 30]}
+
+# Test du stockage compact : types par feature, et sorties du modèle inchangées (à la tolérance près)
+# par rapport au dataframe float64 imputé par la médiane
+def test_compact_data_matches_float64():
+    import pandas as pd
+    from sklearn.impute import SimpleImputer
+    from API import DATA_PATH, reloader
+    state = reloader.current
+    features_matrix, relevant_features = state.features_matrix, state.relevant_features
+    df = pd.read_parquet(DATA_PATH)
+    X = SimpleImputer(strategy='median').fit_transform(df[relevant_features])
+    assert features_matrix.kinds[relevant_features.index('FLAG_OWN_CAR')] == "flag"
+    assert features_matrix.codes.dtype == np.int8 and features_matrix.continuous.dtype == np.float32
+    assert np.allclose(np.asarray(features_matrix), X, rtol=1e-6)
+    assert np.abs(state.load_clf.predict_proba(features_matrix[:1000]) - state.load_clf.predict_proba(X[:1000])).max() < 1e-6
+    frame = state.dataset.frame([0], ['CODE_GENDER', 'FLAG_OWN_CAR'])
+    assert str(frame['CODE_GENDER'].dtype) == "category" and frame['FLAG_OWN_CAR'].dtype == np.int8
+
+# Test de la route du rapport mémoire
+def test_get_memory_stats():
+    response = client.get("/stats/memory")
+    assert response.status_code == 200
+    report = response.json()
+    assert report["compact_bytes"] < report["float64_bytes"]
+    assert report["process_rss_bytes"] > 0
+
+# Test du rechargement à chaud : jeton requis, nouvel état substitué, version dans chaque réponse
+def test_admin_reload(monkeypatch):
+    import API
+    monkeypatch.setattr(API, "ADMIN_TOKEN", "secret")
+    old = API.reloader.current
+    assert client.post("/admin/reload").status_code == 403
+    response = client.post("/admin/reload", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 202
+    API.reloader.wait()
+    assert API.reloader.current is not old
+    assert API.reloader.status()["last_error"] is None
+    response = client.get("/credit/369780")
+    assert response.headers["X-Model-Version"] == API.reloader.current.model_version
+    assert client.get("/version").json()["model_version"] == old.model_version
+
+# Test des mesures Prometheus : requêtes, étapes des routes, caches et mémoire
+def test_get_metrics():
+    client.get("/credit/369780")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'api_requests_total{route="/credit/{id_client}",method="GET",status="200"}' in text
+    assert 'api_stage_duration_seconds_count{route="/credit/{id_client}",stage="lookup"}' in text
+    assert 'api_request_duration_seconds_bucket{route="/credit/{id_client}",method="GET",le="+Inf"}' in text
+    assert 'api_cache_hit_ratio{cache="shap"}' in text
+    assert "api_requests_in_flight 1" in text
+    rss = [line for line in text.splitlines() if line.startswith("process_resident_memory_bytes ")]
+    assert int(rss[0].split()[1]) > 0
+
+# Test du profilage à la demande : désactivé par défaut, piles au format « collapsed » sinon
+def test_admin_profile(monkeypatch):
+    import API
+    monkeypatch.setattr(API, "ADMIN_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    assert client.post("/admin/profile", params={"seconds": 0.1}, headers=headers).status_code == 403
+    monkeypatch.setattr(API, "PROFILER_ENABLED", True)
+    response = client.post("/admin/profile", params={"seconds": 0.2, "interval_ms": 10}, headers=headers)
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("MainThread;" in line for line in lines)
+
+# Test du rechargement en échec : l'état servi reste inchangé et l'erreur est conservée
+def test_hot_reloader_keeps_state_on_failure():
+    from hot_reload import HotReloader
+    def fail():
+        raise OSError("fichier illisible")
+    reloader = HotReloader([], fail, initial="v1")
+    assert reloader.reload()
+    reloader.wait()
+    assert reloader.current == "v1"
+    assert "fichier illisible" in reloader.status()["last_error"]
+
+# Test du verrou des artefacts : les constructions concurrentes d'une même source sont sérialisées
+def test_artifact_lock_serializes_builds(tmp_path):
+    import threading
+    import time
+    from artifacts import artifact_lock
+    events = []
+    def build(name):
+        with artifact_lock(tmp_path / "test_df.parquet"):
+            events.append(f"{name}:début")
+            time.sleep(0.05)
+            events.append(f"{name}:fin")
+    threads = [threading.Thread(target=build, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [event.split(":")[1] for event in events] == ["début", "fin", "début", "fin"]
+
+# Test du regroupement des requêtes concurrentes en un seul appel au modèle
+def test_micro_batcher_coalesces_requests():
+    import asyncio
+    from batching import MicroBatcher
+    calls = []
+    def predict(X):
+        calls.append(len(X))
+        return X[:, 0] * 2
+    batcher = MicroBatcher(predict, max_batch_size=64, max_wait=0.01)
+    async def run():
+        return await asyncio.gather(*(batcher.submit(np.array([float(i)])) for i in range(10)))
+    results = asyncio.run(run())
+    assert results == [2.0 * i for i in range(10)]
+    assert calls == [10]
+    assert batcher.stats.as_dict()["mean_batch_size"] == 10
+
+# Test de la route des statistiques de regroupement : les demandeurs /score seuls passent par le regroupement
+def test_get_batching_stats():
+    requests_before = client.get("/stats/batching").json()["requests"]
+    client.post("/score", json={"applicant": {"AMT_CREDIT": 100000.0}})
+    response = client.get("/stats/batching")
+    assert response.status_code == 200
+    assert "mean_batch_size" in response.json()
+    assert "mean_queue_wait_ms" in response.json()
+    assert response.json()["requests"] == requests_before + 1
+
+# Test de la limite de concurrence : 503 quand la file d'une route coûteuse est pleine
+def test_route_limiter_backpressure():
+    import asyncio
+    import time
+    from fastapi import HTTPException
+    from route_limits import RouteLimiter
+    limiter = RouteLimiter("test", max_concurrency=1, max_queue=1)
+    async def run():
+        return await asyncio.gather(*(limiter.run(time.sleep, 0.05) for _ in range(3)), return_exceptions=True)
+    results = asyncio.run(run())
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 503
+    assert limiter.stats()["pending"] == 0 and limiter.stats()["rejected"] == 1
+
+# Test des réponses en flux : place prise dès la création de la réponse (503 avant l'envoi du statut
+# quand le pool est saturé de flux), blocs produits dans le pool de la route, place rendue une seule
+# fois, que le flux soit parcouru ou que le client se déconnecte avant le corps
+def test_route_limiter_streaming_response():
+    import asyncio
+    import threading
+    from fastapi import HTTPException
+    from route_limits import RouteLimiter
+    limiter = RouteLimiter("test", max_concurrency=1, max_queue=1)
+    def blocks():
+        for i in range(3):
+            yield threading.current_thread().name
+    async def disconnected_send(message):
+        raise OSError("client déconnecté")
+    async def run():
+        responses = [limiter.streaming_response(blocks()) for _ in range(2)]
+        with pytest.raises(HTTPException) as rejected:
+            limiter.streaming_response(blocks())
+        assert rejected.value.status_code == 503 and limiter.stats()["pending"] == 2
+        items = [item async for item in responses[0].body_iterator]
+        assert limiter.stats()["pending"] == 1
+        with pytest.raises(Exception):
+            await responses[1]({"type": "http", "asgi": {"spec_version": "2.4"}}, None, disconnected_send)
+        return items
+    items = asyncio.run(run())
+    assert len(items) == 3 and all(name.startswith("test-worker") for name in items)
+    assert limiter.stats()["pending"] == 0
+
+# Test du scoring par lot quand le pool du modèle est saturé : 503 avant le début du flux
+def test_predict_credit_batch_saturated():
+    from API import model_limiter
+    saturation = model_limiter.max_concurrency + model_limiter.max_queue
+    model_limiter.pending += saturation
+    try:
+        response = client.post("/credit/batch", json={"ids": [369780]})
+    finally:
+        model_limiter.pending -= saturation
+    assert response.status_code == 503 and model_limiter.stats()["pending"] == 0
+
+# Test du scoring d'un demandeur seul quand le pool du modèle est saturé : 503, sans entrer dans le regroupement
+def test_score_applicant_saturated():
+    from API import model_limiter, reloader
+    saturation = model_limiter.max_concurrency + model_limiter.max_queue
+    batched = reloader.current.score_batcher.stats.as_dict()["requests"]
+    model_limiter.pending += saturation
+    try:
+        response = client.post("/score", json={"applicant": {"AMT_CREDIT": 100000.0}})
+    finally:
+        model_limiter.pending -= saturation
+    assert response.status_code == 503
+    assert reloader.current.score_batcher.stats.as_dict()["requests"] == batched
+    assert client.post("/score", json={"applicant": {"AMT_CREDIT": 100000.0}}).status_code == 200
+    assert model_limiter.stats()["pending"] == 0
+
+# Test de la route des statistiques des pools de calcul
+def test_get_limits_stats():
+    response = client.get("/stats/limits")
+    assert response.status_code == 200
+    assert set(response.json()) == {"model", "shap", "knn", "data"}
+
+# Test de la route de scoring par lot à partir des identifiants clients
+def test_predict_credit_batch_ids():
+    client_id = 369780
+    response = client.post("/credit/batch", json={"ids": [client_id, 1]})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["SK_ID_CURR"] for line in lines] == [client_id, 1]
+    single = client.get(f"/credit/{client_id}").json()
+    assert lines[0]["Prédiction"] == single["Prédiction"]
+    assert round(lines[0]["Probabilité"], 2) == single["Probabilité"]
+    assert "Erreur" in lines[1]
+
+# Test de la route de scoring par lot à partir de lignes de features brutes
+def test_predict_credit_batch_rows():
+    response = client.post("/credit/batch", json={"rows": [{"AMT_CREDIT": 100000.0}, {}]})
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 2
+    response = client.post("/credit/batch", json={"rows": [{"UNKNOWN_FEATURE": 1.0}]})
+    assert response.status_code == 422
+
+# Test du scoring de nouveaux demandeurs : mêmes scores que les clients servis, en un ou plusieurs
+def test_score_applicants():
+    from API import reloader
+    state = reloader.current
+    applicant = dict(zip(state.relevant_features, state.features_matrix[0].tolist()))
+    expected = state.score_table.lookup(0)
+    response = client.post("/score", json={"applicant": applicant})
+    assert response.status_code == 200
+    assert response.json()["Prédiction"] == expected[1]
+    assert abs(response.json()["Probabilité"] - expected[0]) < 1e-5
+
+    response = client.post("/score", params={"top_k": 3}, json={"applicants": [applicant, {"AMT_CREDIT": 100000.0}]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 2
+    assert len(results[0]["shap_values"]["features"]) == 3
+    shap_values = state.shap_cache.get(0)
+    assert np.allclose(results[0]["shap_values"]["values"], sorted(shap_values, key=abs, reverse=True)[:3], atol=1e-5)
+
+    assert client.post("/score", json={"applicant": {"UNKNOWN_FEATURE": 1.0}}).status_code == 422
+    assert client.post("/score", json={}).status_code == 422
+    assert client.post("/score", json={"applicants": []}).status_code == 422
+    assert client.post("/score", params={"top_k": 3}, json={"applicants": []}).status_code == 422
+
+# Test du moteur de scoring natif : mêmes probabilités que predict_proba, ligne seule ou bloc, float32 ou float64
+def test_native_engine_matches_sklearn():
+    from API import reloader
+    from inference import NativeBoosterEngine
+    state = reloader.current
+    engine = NativeBoosterEngine(state.load_clf.booster_, num_threads=2)
+    X = state.features_matrix[:500]
+    expected = state.load_clf.predict_proba(X)
+    assert np.allclose(engine.predict_proba(X), expected, rtol=0, atol=1e-12)
+    assert np.allclose(engine.predict_proba(X.astype(np.float64)), expected, rtol=0, atol=1e-12)
+    assert np.allclose(engine.predict_proba(X[:1]), expected[:1], rtol=0, atol=1e-12)
+    assert np.isclose(engine.predict_row(X[7]), expected[7, 1], rtol=0, atol=1e-12)
+
+# Test de la transformation des lignes brutes : ordre des colonnes et médianes pour les valeurs manquantes
+def test_feature_transform():
+    from preprocessing import FeatureTransform
+    transform = FeatureTransform(["a", "b", "c"], [1.0, 2.0, 3.0])
+    X = transform.transform([{"c": 30.0, "a": None}, {"b": float("nan")}, {}])
+    assert X.tolist() == [[1.0, 2.0, 30.0], [1.0, 2.0, 3.0], [1.0, 2.0, 3.0]]
+    assert transform.unknown_features([{"a": 1.0, "z": 2.0}]) == ["z"]
+
 # Test de la route pour récupérer les données d'un client spécifique
 def test_get_client_data():
     client_id = 369780
@@ -38,12 +376,82 @@ def test_get_client_data():
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
+# Test de la fidélité des valeurs servies : chaque valeur de plusieurs clients est, à l'écriture près,
+# la valeur du parquet d'origine stockée en float32 (forme décimale la plus courte), dans /client_data et /client_bundle
+def test_client_data_matches_source():
+    import pandas as pd
+    source = pd.read_parquet("test_df.parquet")
+    for _, expected in source.sample(20, random_state=0).iterrows():
+        id_client = int(expected["SK_ID_CURR"])
+        served = client.get(f"/client_data/{id_client}").json()[0]
+        profile = client.get(f"/client_bundle/{id_client}").json()["profile"]
+        for row in [served, profile]:
+            for name, value in row.items():
+                if not pd.isna(expected[name]):
+                    assert value == float(str(np.float32(expected[name]))), (id_client, name)
+
+# Test des routes par client pour un identifiant inconnu
+def test_client_routes_unknown_client():
+    for route in ["credit", "client_data", "nearest_neighbors", "shap_values"]:
+        for id_client in [1, 2**70]:
+            response = client.get(f"/{route}/{id_client}")
+            assert response.status_code == 404
+    response = client.post("/credit/batch", json={"ids": [2**70]})
+    assert "Erreur" in json.loads(response.text)
+
+# Test de la projection des champs renvoyés (jeu nommé, colonne, champ inconnu)
+def test_client_routes_fields():
+    client_id = 369780
+    response = client.get(f"/client_data/{client_id}?fields=profile")
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"SK_ID_CURR", "CODE_GENDER", "DAYS_BIRTH", "NAME_FAMILY_STATUS_MARRIED",
+                                       "CNT_CHILDREN", "FLAG_OWN_CAR", "FLAG_OWN_REALTY", "DAYS_EMPLOYED"}
+    response = client.get(f"/nearest_neighbors/{client_id}?fields=AMT_CREDIT")
+    assert response.status_code == 200
+    assert all(set(row) == {"SK_ID_CURR", "AMT_CREDIT"} for row in response.json())
+    assert client.get(f"/client_data/{client_id}?fields=UNKNOWN_FIELD").status_code == 422
+    assert client.get(f"/nearest_neighbors/{client_id}?fields=UNKNOWN_FIELD").status_code == 422
+
 # Test de la route pour récupérer les données de l'ensemble des clients
 def test_get_all_clients_data():
     response = client.get("/all_clients_data")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
+# Test de la route de distribution d'une feature avec le rang centile du client
+def test_get_feature_distribution():
+    from API import reloader
+    state = reloader.current
+    client_id = 369780
+    response = client.get(f"/distribution/AMT_CREDIT?id_client={client_id}")
+    assert response.status_code == 200
+    distribution = response.json()
+    assert sum(distribution["histogram"]["counts"]) == distribution["count"]
+    assert len(distribution["kde"]["x"]) == len(distribution["kde"]["y"])
+    column = state.features_matrix[:, state.feature_columns["AMT_CREDIT"]]
+    value = column[state.get_client_position(client_id)]
+    assert abs(distribution["client"]["percentile"] - 100 * (column < value).mean()) < 1
+    assert client.get("/distribution/UNKNOWN_FEATURE").status_code == 404
+
+# Test de la négociation du format des routes tabulaires (Arrow IPC, msgpack, JSON par défaut)
+def test_tabular_routes_formats():
+    import msgpack
+    import pyarrow as pa
+    client_id = 369780
+    expected = client.get(f"/client_data/{client_id}").json()
+    response = client.get(f"/client_data/{client_id}", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.to_pylist()[0]["SK_ID_CURR"] == client_id
+    response = client.get(f"/nearest_neighbors/{client_id}", headers={"Accept": "application/msgpack"})
+    assert msgpack.unpackb(response.content)[0]["SK_ID_CURR"] == client_id
+    response = client.get(f"/client_data/{client_id}", headers={"Accept": "text/html, */*"})
+    assert response.headers["content-type"] == "application/json"
+    assert response.json()[0]["SK_ID_CURR"] == expected[0]["SK_ID_CURR"]
+    response = client.get("/shap", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["feature", "mean_abs_shap"]
+
 # Test de la route pour calculer les plus proches voisins du client_id
 def test_get_nearest_neighbors():
     client_id = 369780
@@ -51,6 +459,62 @@ def test_get_nearest_neighbors():
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
+# Test de la route regroupant les données d'un client pour le tableau de bord : mêmes résultats que les routes séparées
+def test_get_client_bundle():
+    client_id = 369780
+    variable = client.get("/features").json()[0]
+    response = client.get(f"/client_bundle/{client_id}", params={"variable": variable, "top_k": 5})
+    assert response.status_code == 200
+    bundle = response.json()
+    assert bundle["SK_ID_CURR"] == client_id
+    assert bundle["decision"] == client.get(f"/credit/{client_id}").json()
+    assert bundle["profile"]["SK_ID_CURR"] == client_id
+    assert len(bundle["shap_values"]["features"]) == len(bundle["shap_values"]["values"]) == 5
+    neighbors = client.get(f"/nearest_neighbors/{client_id}", params={"fields": variable}).json()
+    assert bundle["neighbors"]["SK_ID_CURR"] == [row["SK_ID_CURR"] for row in neighbors]
+    assert bundle["distribution"]["client"]["value"] == neighbors[0][variable]
+
+    response = client.get(f"/client_bundle/{client_id}")
+    assert response.status_code == 200
+    assert response.json()["neighbors"] is None and response.json()["distribution"] is None
+    assert client.get(f"/client_bundle/{client_id}", params={"variable": "UNKNOWN"}).status_code == 404
+    assert client.get("/client_bundle/1").status_code == 404
+    from API import KNN_MAX_NEIGHBORS
+    response = client.get(f"/client_bundle/{client_id}", params={"variable": variable, "n_neighbors": KNN_MAX_NEIGHBORS + 1})
+    assert response.status_code == 422
+
+# Test de la réutilisation de l'index des plus proches voisins avec un autre n_neighbors
+def test_get_nearest_neighbors_n_neighbors():
+    client_id = 369780
+    response = client.get(f"/nearest_neighbors/{client_id}?n_neighbors=5")
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert response.json()[0]["SK_ID_CURR"] == client_id
+    from API import KNN_MAX_NEIGHBORS
+    for mode in ["exact", "approx"]:
+        response = client.get(f"/nearest_neighbors/{client_id}", params={"n_neighbors": KNN_MAX_NEIGHBORS + 1, "mode": mode})
+        assert response.status_code == 422
+
+# Test du mode approximatif de la route des plus proches voisins
+def test_get_nearest_neighbors_approx():
+    client_id = 369780
+    response = client.get(f"/nearest_neighbors/{client_id}?mode=approx")
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    assert response.json()[0]["SK_ID_CURR"] == client_id
+
+# Test de la concordance de l'index avec NearestNeighbors de scikit-learn
+def test_knn_index_matches_sklearn():
+    from sklearn.neighbors import NearestNeighbors
+    from API import reloader
+    from knn_index import KnnIndex
+    features_matrix = reloader.current.features_matrix
+    index = KnnIndex.build(features_matrix, scaling=True)
+    scaled = (np.asarray(features_matrix, dtype=np.float64) - index.mean) / index.scale
+    _, expected = NearestNeighbors(n_neighbors=10).fit(scaled).kneighbors(scaled[:1])
+    indices, _ = index.query(features_matrix[0], 10)
+    assert set(indices) == set(expected[0])
+
 # Test de la route pour récupérer les valeurs SHAP par client
 def test_get_shap_values_by_client():
     client_id = 369780
@@ -59,6 +523,62 @@ def test_get_shap_values_by_client():
     assert "features" in response.json()
     assert "values" in response.json()
 
+# Test du cache SHAP : calcul à la demande, LRU, persistance disque et invalidation
+def test_shap_cache_tiers(tmp_path):
+    from shap_cache import ShapCache
+    features = np.arange(12, dtype=np.float64).reshape(4, 3)
+    calls = []
+    def compute(X):
+        calls.append(len(X))
+        return -X
+    data_path = tmp_path / "test_df.parquet"
+    cache = ShapCache(data_path, features, compute, source="v1", lru_size=2)
+    assert (cache.get(1) == -features[1]).all()
+    cache.get(1)
+    assert calls == [1] and cache.hits == 1
+    cache.fill()
+    assert calls == [1, 3]
+    reopened = ShapCache(data_path, features, compute, source="v1")
+    assert (reopened.get(3) == -features[3]).all() and reopened.disk_hits == 1
+    invalidated = ShapCache(data_path, features, compute, source="v2")
+    assert invalidated.stats()["filled"] == 0 and invalidated.get_cached(0) is None
+
+# Test des valeurs SHAP déjà en cache : servies sans passer par le pool SHAP, même saturé
+def test_shap_values_cached_bypass_pool():
+    from API import shap_limiter
+    client_id = 369780
+    expected = client.get(f"/shap_values/{client_id}").json()
+    shap_limiter.pending += shap_limiter.max_concurrency + shap_limiter.max_queue
+    try:
+        response = client.get(f"/shap_values/{client_id}")
+    finally:
+        shap_limiter.pending -= shap_limiter.max_concurrency + shap_limiter.max_queue
+    assert response.status_code == 200
+    assert response.json() == expected
+
+# Test de la sélection des top_k contributions SHAP côté serveur
+def test_get_shap_values_top_k():
+    client_id = 369780
+    full = client.get(f"/shap_values/{client_id}").json()
+    response = client.get(f"/shap_values/{client_id}?top_k=10")
+    assert response.status_code == 200
+    top = response.json()
+    expected = sorted(zip(full["features"], full["values"][0]), key=lambda x: abs(x[1]), reverse=True)[:10]
+    assert top["features"] == [name for name, _ in expected]
+    assert len(top["feature_values"]) == 10 and "expected_value" in top
+    negative = client.get(f"/shap_values/{client_id}?top_k=5&sign=negative").json()
+    assert all(value < 0 for value in negative["values"][0])
+
+# Test de la cohérence des valeurs SHAP servies avec l'explainer
+def test_shap_values_by_client_match_explainer():
+    from API import class0_shap_values, reloader
+    state = reloader.current
+    client_id = 369780
+    values = client.get(f"/shap_values/{client_id}").json()["values"]
+    position = state.get_client_position(client_id)
+    expected = class0_shap_values(state.explainer, state.features_matrix[position:position + 1])[0]
+    assert np.allclose(values[0], expected, atol=1e-5)
+
 # Test de la route pour obtenir les valeurs SHAP de l'ensemble des données
 def test_get_shap_values():
     response = client.get("/shap")
@@ -66,6 +586,20 @@ def test_get_shap_values():
     assert "features" in response.json()
     assert "values" in response.json()
 
+# Test de l'importance globale : moyenne des |SHAP| classée, avec taille d'échantillon et version
+def test_get_shap_values_ranking():
+    from API import reloader
+    state = reloader.current
+    shap_cache = state.shap_cache
+    response = client.get("/shap")
+    ranking = response.json()["ranking"]
+    scores = [item["mean_abs_shap"] for item in ranking]
+    assert scores == sorted(scores, reverse=True)
+    assert response.json()["sample_size"] >= 1
+    assert response.json()["model_version"] == state.model_version
+    rows = np.flatnonzero(shap_cache.filled)[:10]
+    assert np.allclose(shap_cache.values[rows], state.parallel_shap_values(shap_cache.features[rows]), atol=1e-5)
+
 # Test de la route pour évaluer le data drift
 def test_evaluate_data_drift():
     response = client.get("/data_drift")
@@ -74,5 +608,35 @@ def test_evaluate_data_drift():
     assert "data" in response.json()
     assert "metrics" in response.json()
 
+# Test du suivi de la dérive : trafic scoré pris en compte, fenêtre choisie et top_k
+def test_data_drift_window():
+    client.get("/credit/369780")
+    response = client.get("/data_drift", params={"window": "all", "top_k": 5})
+    assert response.status_code == 200
+    metrics = response.json()["metrics"]
+    assert list(metrics) == ["all"]
+    assert metrics["all"]["rows"] >= 1
+    assert len(metrics["all"]["features"]) == 5
+    assert client.get("/data_drift", params={"window": "2d"}).status_code == 422
+
+# Test des indicateurs de dérive : nuls sans décalage, élevés sur un décalage, fenêtres glissantes
+def test_drift_monitor_metrics():
+    from drift_monitor import DriftMonitor
+    rng = np.random.RandomState(0)
+    reference = rng.normal(size=(5000, 2))
+    monitor = DriftMonitor(reference, ["a", "b"], {"1m": 60}, n_bins=10, bucket_seconds=10)
+    monitor.observe(reference[:2500], now=1000)
+    shifted = rng.normal(size=(2500, 2)) + [0, 1]
+    monitor.observe(shifted, now=1100)
+
+    window = monitor.report("1m", now=1100)["metrics"]["1m"]
+    assert window["rows"] == 2500
+    assert window["features"]["a"]["psi"] < 0.05 and not window["features"]["a"]["drift"]
+    assert window["features"]["b"]["psi"] > 0.5 and window["features"]["b"]["drift"]
+    assert window["features"]["b"]["ks"] > window["features"]["a"]["ks"]
+    assert 0 <= window["features"]["a"]["js"] < window["features"]["b"]["js"] <= 1
+    assert monitor.report("all", now=1100)["metrics"]["all"]["rows"] == 5000
+    assert monitor.report("1m", now=1200)["metrics"]["1m"]["rows"] == 0
+
 if __name__ == "__main__":
     pytest.main()
@@ -0,0 +1,104 @@
+# Exécution des calculs coûteux hors de la boucle asyncio, avec limites de concurrence par route
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+
+class RouteLimiter:
+    """Pool de threads borné dédié à une famille de routes (modèle, SHAP, kNN, données).
+
+    Au plus max_concurrency calculs s'exécutent en parallèle et max_queue requêtes attendent ;
+    au-delà, la requête est refusée immédiatement avec une 503, ce qui garde les routes peu
+    coûteuses (et la boucle asyncio) réactives quand les routes lourdes sont saturées.
+    """
+
+    def __init__(self, name, max_concurrency, max_queue):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"{name}-worker")
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    # Admission d'une requête, 503 si la file est pleine
+    def acquire(self):
+        with self._lock:
+            if self.pending >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(status_code=503, detail=f"Serveur saturé ({self.name}), réessayer plus tard",
+                                    headers={"Retry-After": "1"})
+            self.pending += 1
+
+    def release(self):
+        with self._lock:
+            self.pending -= 1
+
+    # Place dans la file tenue pendant un calcul soumis autrement (par exemple un regroupement dont les
+    # lots s'exécutent dans le pool de la route), 503 si la file est pleine
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    # Exécution de fn(*args) dans le pool de la route, sans bloquer la boucle asyncio
+    async def run(self, fn, *args, **kwargs):
+        with self.slot():
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(fn, *args, **kwargs))
+
+    # Réponse en flux : la place est prise dès l'appel (503 avant l'envoi du statut si la file est
+    # pleine) et chaque élément de l'itérateur (un bloc de résultats) est produit dans le pool de la
+    # route. La place est libérée une seule fois, à la fin du flux ou à la fin de la réponse si le flux
+    # n'a jamais été parcouru (client déconnecté avant l'envoi du corps)
+    def streaming_response(self, iterator, media_type=None):
+        self.acquire()
+        released = threading.Event()
+
+        def release_once():
+            if not released.is_set():
+                released.set()
+                self.release()
+
+        async def generate():
+            try:
+                loop = asyncio.get_running_loop()
+                done = object()
+                while (item := await loop.run_in_executor(self.executor, next, iterator, done)) is not done:
+                    yield item
+            finally:
+                release_once()
+                getattr(iterator, "close", lambda: None)()
+
+        return SlotStreamingResponse(generate(), release_once, media_type=media_type)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "pending": self.pending,
+                "rejected": self.rejected,
+            }
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """Réponse en flux qui rend la place de son pool quand elle se termine, même sans avoir été parcourue."""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
@@ -0,0 +1,58 @@
+# Table des scores pré-calculés de la population servie, liée aux versions du modèle et des données
+import numpy as np
+
+from artifacts import artifact_path, atomic_write
+
+
+class ScoreTable:
+    """Probabilité (classe 0) et classe prédite de chaque ligne de features_matrix.
+
+    La table est stockée de façon compacte (float32 / int8) dans test_df.scores.npz avec les
+    empreintes du modèle et des données : elle est reconstruite dès que l'une d'elles change.
+    """
+
+    def __init__(self, probas, predictions, source=""):
+        self.probas = probas
+        self.predictions = predictions
+        self.source = source
+
+    def __len__(self):
+        return len(self.probas)
+
+    # Scoring de toute la population par blocs avec score_fn(X) -> (probas classe 0, classes)
+    @classmethod
+    def build(cls, features, score_fn, chunk_size=10000, source=""):
+        probas = np.empty(len(features), dtype=np.float32)
+        predictions = np.empty(len(features), dtype=np.int8)
+        for start in range(0, len(features), chunk_size):
+            chunk_probas, chunk_predictions = score_fn(features[start:start + chunk_size])
+            probas[start:start + chunk_size] = chunk_probas
+            predictions[start:start + chunk_size] = chunk_predictions
+        return cls(probas, predictions, source)
+
+    def save(self, data_path):
+        atomic_write(artifact_path(data_path, "scores.npz"), lambda f: np.savez(
+            f, probas=self.probas, predictions=self.predictions, source=np.array(self.source)))
+
+    @classmethod
+    def load(cls, data_path):
+        with np.load(artifact_path(data_path, "scores.npz")) as table:
+            return cls(table["probas"], table["predictions"], str(table["source"]))
+
+    # Chargement de la table persistée si les versions correspondent, reconstruction sinon
+    @classmethod
+    def load_or_build(cls, data_path, features, score_fn, model_hash, data_hash, threshold):
+        source = f"{model_hash}:{data_hash}:{threshold}"
+        try:
+            table = cls.load(data_path)
+            if table.source == source and len(table) == len(features):
+                return table
+        except (OSError, KeyError, ValueError):
+            pass
+        table = cls.build(features, score_fn, source=source)
+        table.save(data_path)
+        return table
+
+    # Score pré-calculé d'une ligne : (probabilité classe 0, classe) ; la table couvre toutes les lignes
+    def lookup(self, position):
+        return float(self.probas[position]), int(self.predictions[position])
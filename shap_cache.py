@@ -0,0 +1,174 @@
+# Cache des valeurs SHAP par client : LRU en mémoire devant une matrice float32 mappée sur disque
+#
+# Pré-calcul hors ligne de toute la population : python shap_cache.py
+import fcntl
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from artifacts import artifact_path
+
+
+class ShapCache:
+    """Valeurs SHAP (classe 0) par position de client, sur deux niveaux :
+
+    - un LRU borné en mémoire pour les clients consultés à répétition ;
+    - une matrice clients x features en float32 (test_df.shap.npy) mappée en mémoire,
+      accompagnée d'un indicateur de remplissage par ligne (test_df.shap_filled.npy).
+
+    Le stockage disque est remis à zéro dès que l'empreinte du modèle ou des données change.
+    Les clients absents sont calculés à la demande avec compute_fn(X) puis écrits sur disque.
+    """
+
+    def __init__(self, data_path, features, compute_fn, source, lru_size=1024):
+        self.data_path = data_path
+        self.features = features
+        self.compute_fn = compute_fn
+        self.source = source
+        self.lru_size = lru_size
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._fill_thread = None
+        self._stop_event = threading.Event()
+        self.values, self.filled = self._open_store()
+
+    # Ouverture (ou création) des fichiers mappés, réinitialisés si la version a changé
+    def _open_store(self):
+        values_path = artifact_path(self.data_path, "shap.npy")
+        filled_path = artifact_path(self.data_path, "shap_filled.npy")
+        meta_path = artifact_path(self.data_path, "shap.json")
+        shape = self.features.shape
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta["source"] == self.source:
+                values = np.load(values_path, mmap_mode="r+")
+                filled = np.load(filled_path, mmap_mode="r+")
+                if values.shape == shape and filled.shape == (shape[0],):
+                    return values, filled
+        except (OSError, KeyError, ValueError):
+            pass
+
+        # Création des fichiers sous un nom temporaire puis renommage atomique
+        for path, dtype, file_shape in [(values_path, np.float32, shape), (filled_path, np.uint8, (shape[0],))]:
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=file_shape).flush()
+            os.replace(tmp_path, path)
+        tmp_path = meta_path.with_name(f".{meta_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"source": self.source}, f)
+        os.replace(tmp_path, meta_path)
+        return np.load(values_path, mmap_mode="r+"), np.load(filled_path, mmap_mode="r+")
+
+    # Valeurs SHAP d'un client déjà calculées (LRU, puis disque), None s'il faut les calculer ;
+    # assez rapide pour être appelé depuis la boucle asyncio
+    def get_cached(self, position):
+        with self._lock:
+            row = self._lru.get(position)
+            if row is not None:
+                self._lru.move_to_end(position)
+                self.hits += 1
+                return row
+        if not self.filled[position]:
+            return None
+        row = np.array(self.values[position])
+        self.disk_hits += 1
+        self._remember(position, row)
+        return row
+
+    # Valeurs SHAP d'un client : LRU, puis disque, puis calcul à la demande
+    def get(self, position):
+        row = self.get_cached(position)
+        if row is None:
+            row = np.asarray(self.compute_fn(self.features[position:position + 1])[0], dtype=np.float32)
+            self.values[position] = row
+            self.filled[position] = 1
+            self.misses += 1
+            self._remember(position, row)
+        return row
+
+    def _remember(self, position, row):
+        with self._lock:
+            self._lru[position] = row
+            if len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    # Calcul et écriture sur disque des valeurs SHAP des positions données, par blocs
+    def fill_positions(self, positions, chunk_size=256, compute_fn=None, pause=0.0, stop_event=None):
+        compute_fn = compute_fn or self.compute_fn
+        for start in range(0, len(positions), chunk_size):
+            if stop_event is not None and stop_event.is_set():
+                return
+            chunk = positions[start:start + chunk_size]
+            self.values[chunk] = compute_fn(self.features[chunk])
+            self.filled[chunk] = 1
+            if pause:
+                time.sleep(pause)
+        self.values.flush()
+        self.filled.flush()
+
+    # Remplissage du stockage disque pour toutes les lignes encore absentes
+    def fill(self, **kwargs):
+        self.fill_positions(np.flatnonzero(self.filled[:] == 0), **kwargs)
+
+    # Moyenne des |SHAP| par feature sur les lignes remplies, par blocs : (moyennes, nombre de lignes)
+    def mean_abs_values(self, chunk_size=8192):
+        totals = np.zeros(self.values.shape[1], dtype=np.float64)
+        n_rows = 0
+        for start in range(0, len(self.filled), chunk_size):
+            rows = np.flatnonzero(self.filled[start:start + chunk_size]) + start
+            if len(rows):
+                totals += np.abs(self.values[rows]).sum(axis=0, dtype=np.float64)
+                n_rows += len(rows)
+        return (totals / n_rows if n_rows else totals), n_rows
+
+    # Remplissage en tâche de fond ; un seul processus remplit le stockage partagé (verrou fichier)
+    def start_background_fill(self, compute_fn=None, on_complete=None, **kwargs):
+        if self._fill_thread is not None:
+            return
+
+        def run():
+            lock_path = artifact_path(self.data_path, "shap.lock")
+            with open(lock_path, "w") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+                self.fill(compute_fn=compute_fn, stop_event=self._stop_event, **kwargs)
+            if on_complete is not None and not self._stop_event.is_set():
+                on_complete()
+
+        self._fill_thread = threading.Thread(target=run, name="shap-cache-fill", daemon=True)
+        self._fill_thread.start()
+
+    # Arrêt du remplissage en tâche de fond (après le bloc en cours), libère le verrou fichier
+    def stop_background_fill(self, timeout=None):
+        self._stop_event.set()
+        if self._fill_thread is not None:
+            self._fill_thread.join(timeout)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "lru_size": len(self._lru),
+            "filled": int(np.count_nonzero(self.filled)),
+            "total": len(self.filled),
+        }
+
+
+if __name__ == "__main__":
+    import API
+
+    start = time.perf_counter()
+    state = API.reloader.current
+    state.shap_cache.fill(compute_fn=state.parallel_shap_values, chunk_size=4096)
+    print(f"{state.shap_cache.stats()['filled']} clients pré-calculés en {time.perf_counter() - start:.1f} s")